@@ -0,0 +1,305 @@
+import argparse
+import json
+import mmap
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from functools import lru_cache
+from itertools import chain
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from dream_journal import dream_type_of, tone_of
+from dream_lexicon import Lexicon, get_lexicon
+from dream_matcher import DreamScan
+
+TONES = ("positive", "negative", "neutral")
+DREAM_TYPES = ("true", "bad", "reflective")
+PERIODS = ("day", "week", "month")
+UNDATED = "undated"
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# Days that date() can represent, counted from 1970-01-01
+MIN_DAY, MAX_DAY = date.min.toordinal() - EPOCH_ORDINAL, date.max.toordinal() - EPOCH_ORDINAL
+DATE_PREFIX = re.compile(r"\s*(\d{4}-\d{2}-\d{2})")
+BATCH_SIZE = 4096
+
+
+@lru_cache(maxsize=4096)
+def period_key(day: int, period: str) -> str:
+    """Label of the day, week or month that a day (counted from 1970-01-01) falls in"""
+    when = date.fromordinal(EPOCH_ORDINAL + day)
+    if period == "day":
+        return when.isoformat()
+    if period == "month":
+        return f"{when.year:04d}-{when.month:02d}"
+    year, week, _ = when.isocalendar()
+    return f"{year:04d}-W{week:02d}"
+
+
+def _day(value) -> Optional[int]:
+    """Day number of epoch seconds or of a string starting with an ISO date, or None when missing or out of range"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # NaN fails both comparisons; infinities and millisecond timestamps fall outside the range
+        if not MIN_DAY * 86400 <= value < (MAX_DAY + 1) * 86400:
+            return None
+        return int(value // 86400)
+    if isinstance(value, str):
+        match = DATE_PREFIX.match(value)
+        if match:
+            try:
+                return date.fromisoformat(match.group(1)).toordinal() - EPOCH_ORDINAL
+            except ValueError:
+                return None
+    return None
+
+
+class ArchiveStats:
+    """Theme frequency, theme co-occurrence and tone and dream-type counts per period, mergeable across workers"""
+
+    def __init__(self, themes: Sequence[str], lexicon_version: str, period: str = "week"):
+        self.themes = tuple(themes)
+        self.lexicon_version = lexicon_version
+        self.period = period
+        self.entries = 0
+        self.skipped = 0
+        self.characters = 0
+        self.theme_counts = np.zeros(len(self.themes), dtype=np.int64)
+        # Entries that contain both themes; the diagonal repeats theme_counts
+        self.cooccurrence = np.zeros((len(self.themes), len(self.themes)), dtype=np.int64)
+        # Period -> counts of each tone followed by counts of each dream type
+        self.timeline: Dict[str, np.ndarray] = {}
+
+        self._positions = {theme: i for i, theme in enumerate(self.themes)}
+        self._membership = np.zeros((BATCH_SIZE, len(self.themes)), dtype=np.float32)
+        self._labels = np.zeros((BATCH_SIZE, 2), dtype=np.int64)
+        self._periods: List[str] = []
+
+    def add(self, scan: DreamScan, characters: int, day: Optional[int] = None):
+        """Queue one scanned entry's themes, tone and dream type for the next vectorized fold"""
+        row = len(self._periods)
+        for theme in scan.themes:
+            self._membership[row, self._positions[theme]] = 1.0
+        self._labels[row] = TONES.index(tone_of(scan)), DREAM_TYPES.index(dream_type_of(scan))
+        self._periods.append(UNDATED if day is None else period_key(day, self.period))
+        self.characters += characters
+        if len(self._periods) == BATCH_SIZE:
+            self.fold()
+
+    def fold(self):
+        """Add the queued entries to the counts"""
+        rows = len(self._periods)
+        if not rows:
+            return
+        membership = self._membership[:rows]
+        self.theme_counts += membership.sum(axis=0).astype(np.int64)
+        self.cooccurrence += np.rint(membership.T @ membership).astype(np.int64)
+
+        keys = sorted(set(self._periods))
+        index = {key: i for i, key in enumerate(keys)}
+        periods = np.fromiter((index[key] for key in self._periods), dtype=np.int64, count=rows)
+        width = len(TONES) + len(DREAM_TYPES)
+        counts = np.bincount(periods * width + self._labels[:rows, 0], minlength=len(keys) * width)
+        counts += np.bincount(periods * width + len(TONES) + self._labels[:rows, 1], minlength=len(keys) * width)
+        for key, row in zip(keys, counts.reshape(len(keys), width)):
+            self.timeline[key] = self.timeline[key] + row if key in self.timeline else row
+
+        self.entries += rows
+        membership[:] = 0
+        self._periods.clear()
+
+    def merge(self, other: "ArchiveStats"):
+        """Add another worker's counts to these"""
+        if other.themes != self.themes or other.lexicon_version != self.lexicon_version:
+            raise ValueError(f"cannot merge counts of lexicon {other.lexicon_version} into {self.lexicon_version}")
+        self.fold()
+        other.fold()
+        self.entries += other.entries
+        self.skipped += other.skipped
+        self.characters += other.characters
+        self.theme_counts += other.theme_counts
+        self.cooccurrence += other.cooccurrence
+        for key, row in other.timeline.items():
+            self.timeline[key] = self.timeline[key] + row if key in self.timeline else row
+
+    def summary(self) -> Dict:
+        """Totals, co-occurrence matrix and per-period distributions, ready to serialize"""
+        self.fold()
+        totals = sum(self.timeline.values(), np.zeros(len(TONES) + len(DREAM_TYPES), dtype=np.int64))
+        # Undated entries sort after every dated period
+        periods = sorted(self.timeline, key=lambda key: (key == UNDATED, key))
+        return {
+            "lexicon": self.lexicon_version,
+            "period": self.period,
+            "entries": self.entries,
+            "skipped": self.skipped,
+            "characters": self.characters,
+            "themes": dict(zip(self.themes, self.theme_counts.tolist())),
+            "cooccurrence": {"themes": list(self.themes), "matrix": self.cooccurrence.tolist()},
+            "tones": dict(zip(TONES, totals[:len(TONES)].tolist())),
+            "dream_types": dict(zip(DREAM_TYPES, totals[len(TONES):].tolist())),
+            "timeline": {
+                key: {
+                    "entries": int(self.timeline[key][:len(TONES)].sum()),
+                    "tones": dict(zip(TONES, self.timeline[key][:len(TONES)].tolist())),
+                    "dream_types": dict(zip(DREAM_TYPES, self.timeline[key][len(TONES):].tolist())),
+                }
+                for key in periods
+            },
+        }
+
+    def __getstate__(self):
+        self.fold()
+        state = dict(self.__dict__)
+        # The empty batch buffers are rebuilt on arrival instead of being pickled
+        del state["_membership"], state["_labels"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._membership = np.zeros((BATCH_SIZE, len(self.themes)), dtype=np.float32)
+        self._labels = np.zeros((BATCH_SIZE, 2), dtype=np.int64)
+
+
+def new_stats(period: str = "week", lexicon: Optional[Lexicon] = None) -> ArchiveStats:
+    """Empty counts over the themes of a lexicon, by default the current one"""
+    lexicon = lexicon or get_lexicon()
+    return ArchiveStats(lexicon.themes, lexicon.version, period)
+
+
+def _lines(data, start: int, end: int) -> Iterator[bytes]:
+    position = start
+    while position < end:
+        stop = data.find(b"\n", position, end)
+        stop = end if stop < 0 else stop
+        yield data[position:stop]
+        position = stop + 1
+
+
+def add_jsonl(stats: ArchiveStats, lines: Iterable[bytes], lexicon: Lexicon):
+    """Count JSONL records with their dream in text or dream and their time in created_at or date"""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        if isinstance(record, str):
+            record = {"text": record}
+        text = record.get("text", record.get("dream")) if isinstance(record, dict) else None
+        if not isinstance(text, str) or not text.strip():
+            stats.skipped += 1
+            continue
+        stats.add(lexicon.scan(text), len(text), _day(record.get("created_at", record.get("date"))))
+
+
+def add_text(stats: ArchiveStats, lines: Iterable[bytes], lexicon: Lexicon):
+    """Count plain-text entries separated by blank lines, dated when their first line starts with YYYY-MM-DD"""
+    entry: List[bytes] = []
+    for line in chain(lines, [b""]):
+        if line.strip():
+            entry.append(line.rstrip(b"\r\n"))
+        elif entry:
+            text = b"\n".join(entry).decode("utf-8", "replace")
+            stats.add(lexicon.scan(text), len(text), _day(text))
+            entry = []
+
+
+def split_points(data, parts: int, text: bool) -> List[int]:
+    """Offsets that cut the data into about equal parts at record boundaries"""
+    size = len(data)
+    points = [0]
+    for part in range(1, parts):
+        position = data.find(b"\n", max(size * part // parts, points[-1]))
+        position = size if position < 0 else position + 1
+        # Plain-text entries may span lines, so only a blank line ends one for sure
+        while text and position < size:
+            stop = data.find(b"\n", position)
+            stop = size if stop < 0 else stop
+            blank = not data[position:stop].strip()
+            position = stop + 1
+            if blank:
+                break
+        points.append(min(position, size))
+    points.append(size)
+    return sorted(set(points))
+
+
+def _analyze_range(path: str, start: int, end: int, text: bool, period: str) -> ArchiveStats:
+    # One lexicon for the whole range, even if it is reloaded meanwhile
+    lexicon = get_lexicon()
+    stats = new_stats(period, lexicon)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        (add_text if text else add_jsonl)(stats, _lines(data, start, end), lexicon)
+    stats.fold()
+    return stats
+
+
+def analyze_archive(path: str, text: Optional[bool] = None, period: str = "week", workers: Optional[int] = None) -> ArchiveStats:
+    """Count themes, co-occurrences and tone per period over a JSONL or plain-text archive, split across processes"""
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of {', '.join(PERIODS)}")
+    if text is None:
+        text = not path.endswith((".jsonl", ".ndjson", ".json"))
+    workers = workers or os.cpu_count() or 1
+    stats = new_stats(period)
+    if os.path.getsize(path) == 0:
+        return stats
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        # A few ranges per worker, so one slow range does not hold up the rest
+        points = split_points(data, workers * 4 if workers > 1 else 1, text)
+    ranges = list(zip(points, points[1:]))
+    if workers == 1:
+        for start, end in ranges:
+            stats.merge(_analyze_range(path, start, end, text, period))
+        return stats
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as executor:
+        futures = [executor.submit(_analyze_range, path, start, end, text, period) for start, end in ranges]
+        for future in as_completed(futures):
+            stats.merge(future.result())
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Count themes, theme co-occurrence and tone over time in a dream archive")
+    parser.add_argument("input", help="JSONL file of dreams, plain-text file of blank-line separated entries, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSON file for the report, or - for stdout")
+    parser.add_argument("--format", choices=["jsonl", "text"], default=None, help="default: jsonl for .jsonl/.ndjson/.json files")
+    parser.add_argument("--period", choices=PERIODS, default="week", help="time bucket of the tone timeline")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    text = None if args.format is None else args.format == "text"
+    started = time.perf_counter()
+    if args.input == "-":
+        # A pipe cannot be mapped or split, so it is read in this process
+        lexicon = get_lexicon()
+        stats = new_stats(args.period, lexicon)
+        (add_text if text else add_jsonl)(stats, sys.stdin.buffer, lexicon)
+    else:
+        stats = analyze_archive(args.input, text, args.period, args.workers)
+    report = stats.summary()
+    elapsed = time.perf_counter() - started
+
+    if args.output == "-":
+        sys.stdout.reconfigure(encoding="utf-8")
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    print(
+        f"{report['entries']} entries, {report['skipped']} skipped in {elapsed:.1f}s "
+        f"({report['entries'] / max(elapsed, 1e-9):.0f} entries/s, {report['characters'] / max(elapsed, 1e-9) / 1e6:.1f} M chars/s)",
+        file=sys.stderr,
+    )
+    return 0 if report["entries"] or not report["skipped"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
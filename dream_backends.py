@@ -0,0 +1,547 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from dream_metrics import metrics, stage, timed
+from dream_prompt import Prompt, TokenUsage, build_prompt, estimate_tokens, record_usage
+
+logger = logging.getLogger(__name__)
+
+INTERPRETATION_KEYS = (
+    "summary",
+    "ibn_sirin_analysis",
+    "nabulsi_analysis",
+    "symbolic_meanings",
+    "practical_advice",
+    "spiritual_guidance",
+    "overall_assessment",
+)
+LIST_SECTIONS = ("symbolic_meanings", "practical_advice", "spiritual_guidance")
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class BackendError(Exception):
+    """Raised when a model backend cannot produce an interpretation"""
+
+
+class BackendOverloaded(BackendError):
+    """Raised when a provider's admission queue is full or a request waited past its deadline"""
+
+
+class StreamEvent(NamedTuple):
+    kind: str  # "token" for partial model text, "section" for a finished section, "segment" for a journal segment
+    section: str
+    data: Any
+
+
+_sessions: Dict[str, requests.Session] = {}
+_pool_sizes: Dict[str, int] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(url: str, pool_size: int = 10) -> requests.Session:
+    """Return the process-wide keep-alive session for the endpoint serving url, keeping at least pool_size connections"""
+    parts = urlsplit(url)
+    origin = f"{parts.scheme}://{parts.netloc}"
+    with _sessions_lock:
+        session = _sessions.get(origin)
+        if session is None:
+            session = _sessions[origin] = requests.Session()
+        if _pool_sizes.get(origin, 0) < pool_size:
+            # Retries are handled by the backend so they can share one deadline
+            session.mount(origin, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0))
+            _pool_sizes[origin] = pool_size
+        return session
+
+
+class TokenBucket:
+    """Token bucket refilled at rate tokens per second, holding at most burst tokens"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is available now)"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class AdmissionController:
+    """Per-provider gate: a concurrency limit, an optional rate limit and a bounded FIFO wait queue"""
+
+    def __init__(self, name: str, concurrency: int = 4, rate: float = 0.0, burst: Optional[float] = None,
+                 max_queue: int = 32, max_wait: float = 2.0):
+        self.name = name
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate, burst or concurrency) if rate > 0 else None
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._queue = deque()
+        self._active = 0
+        self._condition = threading.Condition()
+        self._stats = {"admitted": 0, "rejected": 0, "timed_out": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0}
+
+    def _token_delay(self, now: float) -> float:
+        return self.bucket.delay(now) if self.bucket is not None else 0.0
+
+    def acquire(self, timeout: Optional[float] = None, slots: int = 1, token: bool = True):
+        """Wait for slots (and a token, unless token is False) in FIFO order, or raise BackendOverloaded"""
+        started = time.monotonic()
+        deadline = started + (self.max_wait if timeout is None else min(timeout, self.max_wait))
+        ticket = object()
+        with self._condition:
+            if slots > self.concurrency:
+                self._stats["rejected"] += 1
+                raise BackendOverloaded(f"{self.name} allows {self.concurrency} concurrent requests, not {slots}")
+            if len(self._queue) >= self.max_queue:
+                self._stats["rejected"] += 1
+                raise BackendOverloaded(f"{self.name} admission queue is full ({self.max_queue} waiting)")
+            self._queue.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = None
+                    if self._queue[0] is ticket and self._active + slots <= self.concurrency:
+                        wait = self._token_delay(now) if token else 0.0
+                        if wait <= 0:
+                            break
+                    if now >= deadline:
+                        self._stats["timed_out"] += 1
+                        raise BackendOverloaded(f"{self.name} admission wait exceeded {deadline - started:.2f}s")
+                    self._condition.wait(deadline - now if wait is None else min(wait, deadline - now))
+                self._queue.popleft()
+                self._active += slots
+                if token and self.bucket is not None:
+                    self.bucket.take()
+            finally:
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                # The next waiter may be at the head now
+                self._condition.notify_all()
+            waited = time.monotonic() - started
+            self._stats["admitted"] += 1
+            self._stats["wait_seconds_total"] += waited
+            self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+        if metrics.enabled:
+            metrics.record(f"admission_wait_{self.name}", waited)
+
+    def release(self, slots: int = 1):
+        with self._condition:
+            self._active -= slots
+            self._condition.notify_all()
+
+    def throttle(self, timeout: Optional[float] = None):
+        """Take one more token for a request already holding a slot, such as a retry or a reserved fan-out call"""
+        if self.bucket is None:
+            return
+        deadline = time.monotonic() + (self.max_wait if timeout is None else min(timeout, self.max_wait))
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                wait = self._token_delay(now)
+                if wait <= 0:
+                    self.bucket.take()
+                    return
+                if now + wait > deadline:
+                    self._stats["timed_out"] += 1
+                    raise BackendOverloaded(f"{self.name} rate limit leaves no time for a retry")
+                self._condition.wait(wait)
+
+    @contextmanager
+    def admit(self, timeout: Optional[float] = None):
+        """Hold a slot for the duration of the block"""
+        self.acquire(timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, float]:
+        with self._condition:
+            return {**self._stats, "active": self._active, "queue_depth": len(self._queue)}
+
+
+def _admission_setting(provider: str, option: str, default: str) -> str:
+    return os.environ.get(f"DREAM_{provider.upper()}_{option}") or os.environ.get(f"DREAM_BACKEND_{option}") or default
+
+
+@lru_cache(maxsize=None)
+def get_admission_controller(provider: str) -> AdmissionController:
+    """Return the admission controller shared by every backend of a provider in this process"""
+    controller = AdmissionController(
+        provider,
+        concurrency=int(_admission_setting(provider, "CONCURRENCY", "4")),
+        rate=float(_admission_setting(provider, "RATE", "0")),
+        burst=float(_admission_setting(provider, "BURST", "0")) or None,
+        max_queue=int(_admission_setting(provider, "QUEUE", "32")),
+        max_wait=float(_admission_setting(provider, "QUEUE_TIMEOUT", "2")),
+    )
+    metrics.register_collector(f"admission_{provider}", controller.stats)
+    return controller
+
+
+def parse_interpretation(content: str, sections: Tuple[str, ...] = INTERPRETATION_KEYS) -> Dict:
+    """Parse and validate a model reply into an interpretation dict"""
+    start, end = content.find("{"), content.rfind("}")
+    if start == -1 or end < start:
+        raise BackendError("Model reply contains no JSON object")
+    try:
+        data = json.loads(content[start:end + 1])
+    except ValueError as e:
+        raise BackendError(f"Model reply is not valid JSON: {e}") from e
+
+    interpretation = {}
+    for key in sections:
+        value = data.get(key) if isinstance(data, dict) else None
+        if key in LIST_SECTIONS:
+            if isinstance(value, str):
+                value = [value]
+            if not isinstance(value, list) or not value:
+                raise BackendError(f"Model reply is missing section {key!r}")
+            interpretation[key] = [str(item) for item in value]
+        else:
+            if not isinstance(value, str) or not value.strip():
+                raise BackendError(f"Model reply is missing section {key!r}")
+            interpretation[key] = value
+    return interpretation
+
+
+class SectionStreamParser:
+    """Route streamed tokens of a '## section' formatted reply to their sections"""
+
+    def __init__(self):
+        self.section: Optional[str] = None
+        self.lines: List[str] = []
+        self.line = ""
+        self.emitted = 0
+        self.sections: Dict[str, Any] = {}
+
+    def feed(self, token: str) -> List[StreamEvent]:
+        """Consume a token and return the events it completes"""
+        events = []
+        self.line += token
+        while "\n" in self.line:
+            line, self.line = self.line.split("\n", 1)
+            events.extend(self._finish_line(line))
+            self.emitted = 0
+        # A partial line may still turn into a section header, so hold those back
+        pending = self.line[self.emitted:]
+        if self.section and pending.strip() and not self.line.lstrip().startswith("#"):
+            events.append(StreamEvent("token", self.section, pending))
+            self.emitted = len(self.line)
+        return events
+
+    def close(self) -> List[StreamEvent]:
+        """Flush the last line and section"""
+        events = self._finish_line(self.line) if self.line else []
+        self.line = ""
+        return events + self._close_section()
+
+    def _finish_line(self, line: str) -> List[StreamEvent]:
+        stripped = line.strip()
+        if stripped.startswith("#"):
+            name = stripped.lstrip("#").strip().lower()
+            if name in INTERPRETATION_KEYS:
+                events = self._close_section()
+                self.section = name
+                return events
+        if self.section is None:
+            return []
+        self.lines.append(line)
+        tail = line[self.emitted:] + "\n"
+        return [StreamEvent("token", self.section, tail)] if tail.strip() or self.emitted else []
+
+    def _close_section(self) -> List[StreamEvent]:
+        if self.section is None:
+            return []
+        section, text = self.section, "\n".join(self.lines).strip()
+        self.section, self.lines = None, []
+        if section in LIST_SECTIONS:
+            value = [line.strip().lstrip("-•*").strip() for line in text.splitlines() if line.strip()]
+        else:
+            value = text
+        if not value:
+            return []
+        self.sections[section] = value
+        return [StreamEvent("section", section, value)]
+
+
+class HTTPBackend:
+    """Base class for JSON-over-HTTP model backends with pooled sessions and retries"""
+
+    name = "http"
+
+    def __init__(
+        self,
+        url: str,
+        api_key: Optional[str] = None,
+        model: Optional[str] = None,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 20.0,
+        retries: int = 2,
+        backoff: float = 0.5,
+        deadline: float = 30.0,
+        pool_size: Optional[int] = None,
+        admission: Optional[AdmissionController] = None,
+        prompt_budget: Optional[int] = 3000,
+    ):
+        self.url = url
+        self.api_key = api_key
+        self.model = model
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.deadline = deadline
+        self.prompt_budget = prompt_budget  # Longer dreams are shortened to keep the prompt within this many tokens
+        # Shared per provider, so every session's calls queue in one place
+        self.admission = admission if admission is not None else get_admission_controller(self.name)
+        # Every admitted request can keep a connection, so none is opened only to be discarded
+        self.session = get_session(url, max(pool_size or 0, self.admission.concurrency))
+
+    @timed("backend_interpret")
+    def interpret(
+        self,
+        dream_text: str,
+        language: str,
+        guidelines: Dict,
+        sections: Tuple[str, ...] = INTERPRETATION_KEYS,
+        holds_slot: bool = False,
+    ) -> Dict:
+        """Ask the model for a complete interpretation, or only the given sections (holds_slot: the caller reserved a slot for this call)"""
+        prompt = build_prompt(dream_text, language, guidelines, False, sections, LIST_SECTIONS, self.prompt_budget)
+        if holds_slot:
+            # The reserved slot covers concurrency; the request still counts against the rate limit
+            self.admission.throttle(self.deadline)
+            data = self._post(self._payload(prompt.system, prompt.user))
+        else:
+            with self.admission.admit(self.deadline):
+                data = self._post(self._payload(prompt.system, prompt.user))
+        try:
+            content = self._extract_text(data)
+        except (KeyError, IndexError, TypeError) as e:
+            raise BackendError(f"Unexpected {self.name} response shape: {e!r}") from e
+        self._record_usage(data, prompt, content)
+        return parse_interpretation(content, sections)
+
+    def stream(self, dream_text: str, language: str, guidelines: Dict) -> Iterator[StreamEvent]:
+        """Stream model tokens and finished sections as they arrive"""
+        with stage("backend_stream"), self.admission.admit(self.deadline):
+            yield from self._stream_events(dream_text, language, guidelines)
+
+    def _stream_events(self, dream_text: str, language: str, guidelines: Dict) -> Iterator[StreamEvent]:
+        prompt = build_prompt(dream_text, language, guidelines, True, INTERPRETATION_KEYS, LIST_SECTIONS, self.prompt_budget)
+        started = time.monotonic()
+        response = self._request(self._payload(prompt.system, prompt.user, stream=True), stream=True)
+        parser = SectionStreamParser()
+        tokens: List[str] = []
+        reported = None
+        try:
+            with response:
+                for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                    if time.monotonic() - started > self.deadline:
+                        raise BackendError(f"{self.name} stream exceeded its {self.deadline}s deadline")
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    event = json.loads(data)
+                    # Usage, when reported, arrives with the last event
+                    reported = event if self._usage(event) is not None else reported
+                    token = self._extract_delta(event)
+                    if token:
+                        tokens.append(token)
+                        yield from parser.feed(token)
+        except (requests.RequestException, ValueError, KeyError, IndexError, TypeError) as e:
+            raise BackendError(f"{self.name} stream failed: {e!r}") from e
+        self._record_usage(reported, prompt, "".join(tokens))
+        yield from parser.close()
+
+    def _record_usage(self, data, prompt: Prompt, completion: str):
+        usage = self._usage(data) if data is not None else None
+        if usage is None:
+            usage = TokenUsage(prompt.tokens, estimate_tokens(completion), 0, True)
+        record_usage(self.name, self.model, usage, prompt.truncated)
+
+    def _usage(self, data) -> Optional[TokenUsage]:
+        """Token counts the provider reported in a response, if any"""
+        return None
+
+    def _payload(self, system: str, user: str, stream: bool = False) -> Dict:
+        raise NotImplementedError
+
+    def _extract_text(self, data) -> str:
+        raise NotImplementedError
+
+    def _extract_delta(self, event) -> Optional[str]:
+        raise NotImplementedError
+
+    def _headers(self) -> Dict[str, str]:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def _post(self, payload: Dict):
+        response = self._request(payload)
+        try:
+            return response.json()
+        except ValueError as e:
+            raise BackendError(f"{self.name} returned a non-JSON body") from e
+
+    def _request(self, payload: Dict, stream: bool = False) -> requests.Response:
+        started = time.monotonic()
+        last_error: Optional[Exception] = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                # Full jitter keeps concurrent sessions from retrying in lockstep
+                delay = random.uniform(0, self.backoff * 2 ** (attempt - 1))
+                if time.monotonic() - started + delay >= self.deadline:
+                    break
+                time.sleep(delay)
+                # Retries count against the provider's rate limit too
+                self.admission.throttle(self.deadline - (time.monotonic() - started))
+            remaining = self.deadline - (time.monotonic() - started)
+            if remaining <= 0:
+                break
+            try:
+                response = self.session.post(
+                    self.url,
+                    json=payload,
+                    headers=self._headers(),
+                    timeout=(self.connect_timeout, min(self.read_timeout, remaining)),
+                    stream=stream,
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = e
+                continue
+            except requests.RequestException as e:
+                # A bad URL or header fails the same way on every attempt
+                raise BackendError(f"{self.name} request failed: {e!r}") from e
+            if response.status_code in RETRY_STATUSES:
+                response.close()
+                last_error = BackendError(f"{self.name} returned HTTP {response.status_code}")
+                continue
+            if not response.ok:
+                response.close()
+                raise BackendError(f"{self.name} returned HTTP {response.status_code}")
+            return response
+
+        logger.warning("%s backend unavailable: %s", self.name, last_error)
+        raise BackendError(f"{self.name} backend unavailable: {last_error}") from last_error
+
+
+class OpenAIBackend(HTTPBackend):
+    """OpenAI-compatible chat completions backend"""
+
+    name = "openai"
+
+    def __init__(self, url: str, api_key: Optional[str] = None, model: Optional[str] = None, **options):
+        super().__init__(url, api_key, model or "gpt-4o-mini", **options)
+
+    def _payload(self, system: str, user: str, stream: bool = False) -> Dict:
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system},
+                {"role": "user", "content": user},
+            ],
+        }
+        if stream:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
+        else:
+            payload["response_format"] = {"type": "json_object"}
+        return payload
+
+    def _extract_text(self, data) -> str:
+        return data["choices"][0]["message"]["content"]
+
+    def _extract_delta(self, event) -> Optional[str]:
+        # The usage event that ends a stream has no choices
+        return event["choices"][0]["delta"].get("content") if event.get("choices") else None
+
+    def _usage(self, data) -> Optional[TokenUsage]:
+        usage = data.get("usage") if isinstance(data, dict) else None
+        if not usage:
+            return None
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+        return TokenUsage(usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0), cached, False)
+
+
+class HuggingFaceBackend(HTTPBackend):
+    """HuggingFace Inference API text-generation backend"""
+
+    name = "huggingface"
+
+    def __init__(self, url: str, api_key: Optional[str] = None, model: Optional[str] = None, **options):
+        model = model or "mistralai/Mistral-7B-Instruct-v0.3"
+        super().__init__(f"{url.rstrip('/')}/{model}", api_key, model, **options)
+
+    def _payload(self, system: str, user: str, stream: bool = False) -> Dict:
+        return {
+            "inputs": f"{system}\n\n{user}",
+            "parameters": {"max_new_tokens": 1024, "return_full_text": False},
+            "stream": stream,
+        }
+
+    def _extract_text(self, data) -> str:
+        if isinstance(data, list):
+            data = data[0]
+        return data["generated_text"]
+
+    def _extract_delta(self, event) -> Optional[str]:
+        token = event["token"]
+        return None if token.get("special") else token["text"]
+
+
+BACKENDS = {
+    "openai": (OpenAIBackend, "OPENAI_API_KEY"),
+    "huggingface": (HuggingFaceBackend, "HUGGINGFACE_API_TOKEN"),
+}
+
+
+def backend_from_env(apis: Dict[str, str], prefix: str = "DREAM_BACKEND") -> Optional[HTTPBackend]:
+    """Create the backend selected by the prefix variable (DREAM_BACKEND), or None for rule-based only"""
+    name = os.environ.get(prefix, "").strip().lower()
+    if name not in BACKENDS:
+        return None
+    backend_class, key_variable = BACKENDS[name]
+    api_key = os.environ.get(key_variable)
+    url = os.environ.get(f"{prefix}_URL", apis[name])
+    if not api_key and url == apis[name]:
+        logger.warning("%s=%s but %s is not set; using rule-based interpretation", prefix, name, key_variable)
+        return None
+
+    options = {}
+    for option, variable, cast in [
+        ("connect_timeout", f"{prefix}_CONNECT_TIMEOUT", float),
+        ("read_timeout", f"{prefix}_TIMEOUT", float),
+        ("retries", f"{prefix}_RETRIES", int),
+        ("deadline", f"{prefix}_DEADLINE", float),
+        ("pool_size", f"{prefix}_POOL_SIZE", int),
+        ("prompt_budget", f"{prefix}_PROMPT_BUDGET", int),
+    ]:
+        if os.environ.get(variable):
+            options[option] = cast(os.environ[variable])
+    return backend_class(url, api_key, os.environ.get(f"{prefix}_MODEL"), **options)
@@ -0,0 +1,141 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+_interpreter = None
+
+
+def _init_worker():
+    """Create the interpreter once per worker process (or once for all threads)"""
+    global _interpreter
+    if _interpreter is None:
+        from dream_interpreter import AdvancedDreamInterpreter
+        _interpreter = AdvancedDreamInterpreter()
+
+
+def interpret_record(interpreter, index: int, item, language: str) -> Dict:
+    """Interpret one record, turning any failure into an error record"""
+    record_id = index
+    try:
+        if isinstance(item, Exception):
+            raise item
+        if isinstance(item, str):
+            item = {"text": item}
+        if not isinstance(item, dict):
+            raise ValueError(f"expected a string or an object, got {type(item).__name__}")
+        record_id = item.get("id", index)
+        text = item.get("text", item.get("dream"))
+        if not isinstance(text, str) or not text.strip():
+            raise ValueError("record has no dream text")
+        record_language = str(item.get("language", language)).lower()
+        interpretation = interpreter.analyze_dream_with_ai(text, record_language)
+        return {"id": record_id, "language": record_language, "interpretation": interpretation}
+    except Exception as e:
+        return {"id": record_id, "error": f"{type(e).__name__}: {e}"}
+
+
+def _interpret_batch(start: int, items: List, language: str) -> List[Dict]:
+    _init_worker()
+    return [interpret_record(_interpreter, start + offset, item, language) for offset, item in enumerate(items)]
+
+
+def _batches(dreams: Iterable, batch_size: int) -> Iterator[Tuple[int, List]]:
+    batch, start = [], 0
+    for index, dream in enumerate(dreams):
+        if not batch:
+            start = index
+        batch.append(dream)
+        if len(batch) == batch_size:
+            yield start, batch
+            batch = []
+    if batch:
+        yield start, batch
+
+
+def analyze_many(
+    dreams: Iterable,
+    language: str = "english",
+    workers: Optional[int] = None,
+    processes: bool = True,
+    batch_size: int = 16,
+) -> Iterator[Dict]:
+    """Interpret dreams (strings or {"text", "id", "language"} objects) in parallel, in input order"""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for start, batch in _batches(dreams, batch_size):
+            yield from _interpret_batch(start, batch, language)
+        return
+
+    executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    # Only a few batches per worker are in flight, so memory stays bounded for any input size
+    window = workers * 4
+    with executor_class(max_workers=workers, initializer=_init_worker) as executor:
+        pending = deque()
+        for start, batch in _batches(dreams, batch_size):
+            pending.append(executor.submit(_interpret_batch, start, batch, language))
+            if len(pending) >= window:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def _read_records(lines: Iterable[str]) -> Iterator:
+    """Parse JSONL lines, passing invalid lines on as errors to keep their position"""
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield ValueError(f"line {number} is not valid JSON: {e}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Interpret dreams from a JSONL file and write interpretations as JSONL")
+    parser.add_argument("input", nargs="?", default="-", help="JSONL file of dreams, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSONL file for interpretations, or - for stdout")
+    parser.add_argument("-l", "--language", default="english", choices=["english", "urdu"])
+    parser.add_argument("-w", "--workers", type=int, default=None, help="parallel workers (default: CPU count)")
+    parser.add_argument("--threads", action="store_true", help="use threads instead of processes (for backend-bound runs)")
+    parser.add_argument("--batch-size", type=int, default=16)
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    target = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    if target is sys.stdout:
+        sys.stdout.reconfigure(encoding="utf-8")
+
+    ok = failed = 0
+    started = time.perf_counter()
+    try:
+        records = analyze_many(
+            _read_records(source),
+            language=args.language,
+            workers=args.workers,
+            processes=not args.threads,
+            batch_size=args.batch_size,
+        )
+        for record in records:
+            target.write(json.dumps(record, ensure_ascii=False) + "\n")
+            if "error" in record:
+                failed += 1
+            else:
+                ok += 1
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"{ok} interpreted, {failed} failed in {elapsed:.1f}s ({(ok + failed) / max(elapsed, 1e-9):.0f} records/s)", file=sys.stderr)
+    return 1 if failed and not ok else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from dream_cache import InterpretationCache
+from dream_interpreter import AdvancedDreamInterpreter
+from dream_lexicon import scan_dream
+from dream_workload import percentile, synthetic_dream
+
+DEFAULT_SIZES = [50, 1_000, 10_000, 100_000]
+DEFAULT_DENSITIES = [0.05, 0.3]
+
+
+def measure(fn: Callable, setup: Optional[Callable] = None, repeat: int = 20, min_time: float = 0.2) -> Dict:
+    """Time fn over at least repeat runs (and min_time seconds), plus one traced run for peak memory"""
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < repeat or (time.perf_counter() - started < min_time and len(samples) < repeat * 50):
+        if setup:
+            setup()
+        begin = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - begin)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "iterations": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "throughput_per_s": len(samples) / sum(samples),
+        "peak_kb": peak / 1024,
+    }
+
+
+def benchmark_cases(interpreter: AdvancedDreamInterpreter, text: str, language: str) -> Dict[str, tuple]:
+    """Map case name to (fn, setup) for one dream"""
+    urdu = language == "urdu"
+    cold_scan = scan_dream.cache_clear
+    cases = {
+        "detect_dream_themes": (lambda: interpreter._detect_dream_themes(scan_dream(text)), cold_scan),
+        "emotional_tone": (
+            lambda: (interpreter._get_urdu_emotional_tone if urdu else interpreter._get_emotional_tone)(scan_dream(text)),
+            cold_scan,
+        ),
+        "dream_type": (
+            lambda: (interpreter._assess_urdu_dream_type if urdu else interpreter._assess_dream_type)(scan_dream(text)),
+            cold_scan,
+        ),
+    }
+    # Section builders run on an already scanned dream, as they do inside the pipeline
+    for section, build in interpreter._section_builders(text, language).items():
+        cases[f"section:{section}"] = (build, None)
+    cases["analyze_dream_with_ai"] = (lambda: interpreter.analyze_dream_with_ai(text, language), cold_scan)
+    return cases
+
+
+def run(sizes: List[int], densities: List[float], languages: List[str], repeat: int, case_filter: Optional[str] = None) -> Dict:
+    """Run every benchmark case over the synthetic corpora"""
+    # Rule-based only and uncached, so every call does the full work
+    interpreter = AdvancedDreamInterpreter(cache=InterpretationCache(max_entries=0))
+    interpreter.backend = None
+
+    results = []
+    for language in languages:
+        for size in sizes:
+            for density in densities:
+                text = synthetic_dream(size, density, language)
+                for case, (fn, setup) in benchmark_cases(interpreter, text, language).items():
+                    if case_filter and case_filter not in case:
+                        continue
+                    result = {"case": case, "language": language, "size": size, "density": density, "chars": len(text)}
+                    result.update(measure(fn, setup, repeat))
+                    result["mb_per_s"] = len(text.encode("utf-8")) * result["throughput_per_s"] / 1e6
+                    results.append(result)
+                    print(
+                        f"{case:32} {language:7} {size:>7} chars  density {density:<4}  "
+                        f"p50 {result['p50_ms']:9.3f} ms  p99 {result['p99_ms']:9.3f} ms  "
+                        f"{result['throughput_per_s']:10.1f}/s  peak {result['peak_kb']:9.1f} KB",
+                        file=sys.stderr,
+                    )
+    return {"meta": _metadata(repeat), "results": results}
+
+
+def _metadata(repeat: int) -> Dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+
+def compare(baseline: Dict, current: Dict) -> List[str]:
+    """Describe the p50 change of every case present in both result sets"""
+    def key(result):
+        return result["case"], result["language"], result["size"], result["density"]
+
+    previous = {key(result): result for result in baseline["results"]}
+    lines = []
+    for result in current["results"]:
+        before = previous.get(key(result))
+        if before is None:
+            continue
+        ratio = result["p50_ms"] / before["p50_ms"] if before["p50_ms"] else float("inf")
+        lines.append(
+            f"{result['case']:32} {result['language']:7} {result['size']:>7}  density {result['density']:<4}  "
+            f"p50 {before['p50_ms']:9.3f} -> {result['p50_ms']:9.3f} ms  ({ratio:5.2f}x)"
+        )
+    return lines
+
+
+def _number_list(cast):
+    return lambda value: [cast(item) for item in value.split(",") if item]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the dream interpretation engine on synthetic corpora")
+    parser.add_argument("--sizes", type=_number_list(int), default=DEFAULT_SIZES, help="comma-separated dream lengths in characters")
+    parser.add_argument("--densities", type=_number_list(float), default=DEFAULT_DENSITIES, help="comma-separated keyword densities (0-1)")
+    parser.add_argument("--languages", type=lambda value: value.split(","), default=["english", "urdu"])
+    parser.add_argument("--repeat", type=int, default=20, help="minimum timed runs per case")
+    parser.add_argument("--filter", default=None, help="only run cases whose name contains this text")
+    parser.add_argument("-o", "--output", default=None, help="write machine-readable results as JSON")
+    parser.add_argument("--compare", default=None, help="JSON results of an earlier run to compare against")
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, args.densities, args.languages, args.repeat, args.filter)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print("\n".join(compare(json.load(f), report)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
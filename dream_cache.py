@@ -0,0 +1,222 @@
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from dream_metrics import metrics, timed
+
+
+def normalize_dream_text(dream_text: str) -> str:
+    """Normalize case and whitespace so near-identical submissions share a key"""
+    return " ".join(dream_text.split()).casefold()
+
+
+def cache_key(dream_text: str, language: str, version: str) -> str:
+    """Build the cache key for a dream, language and backend/lexicon version"""
+    raw = "\0".join([version, language.lower(), normalize_dream_text(dream_text)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class InterpretationCache:
+    """Process-wide LRU/TTL cache of interpretations with an optional SQLite tier"""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 24 * 3600, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS interpretations "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM interpretations WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+
+    @timed("cache_get")
+    def get(self, key: str) -> Optional[Dict]:
+        """Return a copy of the cached interpretation, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(value)
+                del self._entries[key]
+                self.expirations += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM interpretations WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    value = json.loads(row[0])
+                    self._store(key, value, row[1])
+                    self.disk_hits += 1
+                    return copy.deepcopy(value)
+
+            self.misses += 1
+            return None
+
+    @timed("cache_set")
+    def set(self, key: str, value: Dict):
+        """Cache an interpretation in memory and, if configured, on disk"""
+        expires_at = time.time() + self.ttl
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._store(key, value, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO interpretations (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), expires_at),
+                )
+                self._db.commit()
+
+    def clear(self):
+        """Drop every cached interpretation"""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM interpretations")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss/eviction counters and the current size"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "size": len(self._entries),
+            }
+
+    def _store(self, key: str, value: Dict, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+class Flight:
+    """One in-flight computation that any number of callers can wait on"""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+    def wait(self, timeout: Optional[float] = None) -> Any:
+        """Block until the leader finishes; followers receive a copy of its result"""
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Coalesced request did not finish within {timeout}s")
+        if self.error is not None:
+            raise self.error
+        return copy.deepcopy(self.result)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one computation"""
+
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.timeouts = 0
+
+    def begin(self, key: str) -> Tuple[Flight, bool]:
+        """Join the flight for key, returning it and whether the caller must lead it"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight, False
+            flight = self._flights[key] = Flight()
+            self.leaders += 1
+            return flight, True
+
+    def finish(self, key: str, flight: Flight, result: Any = None, error: Optional[BaseException] = None):
+        """Publish the leader's result or error to every waiter"""
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if error is not None:
+                self.errors += 1
+        flight.result, flight.error = result, error
+        flight._done.set()
+
+    def wait(self, flight: Flight, timeout: Optional[float] = None) -> Any:
+        """Wait on a flight led by another caller"""
+        try:
+            return flight.wait(timeout)
+        except TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise
+
+    def do(self, key: str, compute: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """Run compute once for all concurrent callers with the same key"""
+        flight, leader = self.begin(key)
+        if not leader:
+            return self.wait(flight, timeout)
+        try:
+            result = compute()
+        except BaseException as e:
+            self.finish(key, flight, error=e)
+            raise
+        self.finish(key, flight, result)
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        """Return leader/coalesced/error/timeout counters and the in-flight count"""
+        with self._lock:
+            return {
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "in_flight": len(self._flights),
+            }
+
+
+@lru_cache(maxsize=None)
+def get_single_flight() -> SingleFlight:
+    """Return the request coalescer shared by every session in this process"""
+    single_flight = SingleFlight()
+    metrics.register_collector("single_flight", single_flight.stats)
+    return single_flight
+
+
+@lru_cache(maxsize=None)
+def get_interpretation_cache() -> InterpretationCache:
+    """Return the cache shared by every session in this process"""
+    cache = InterpretationCache(
+        max_entries=int(os.environ.get("DREAM_CACHE_SIZE", "1024")),
+        ttl=float(os.environ.get("DREAM_CACHE_TTL", str(24 * 3600))),
+        path=os.environ.get("DREAM_CACHE_PATH") or None,
+    )
+    metrics.register_collector("cache", cache.stats)
+    return cache
@@ -0,0 +1,187 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from functools import lru_cache
+from typing import Dict, Iterator, Optional, Tuple
+
+from dream_backends import INTERPRETATION_KEYS, BackendError, HTTPBackend, backend_from_env
+from dream_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """Sliding window of recent call latencies"""
+
+    def __init__(self, window: int = 200, min_samples: int = 10):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """The given percentile of the window, or None until there are enough samples"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(percent / 100 * len(ordered)))]
+
+
+@lru_cache(maxsize=None)
+def latency_tracker(backend_name: str, model: str) -> LatencyTracker:
+    """Return the latency window shared by every session calling one backend model"""
+    return LatencyTracker()
+
+
+_stats = {"sections": 0, "hedged": 0, "hedge_wins": 0, "timed_out": 0, "failed": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name: str, delta: int = 1):
+    with _stats_lock:
+        _stats[name] += delta
+
+
+def fanout_stats() -> Dict[str, int]:
+    """Section, hedge and timeout counts of every fan-out in this process"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+@lru_cache(maxsize=None)
+def get_fanout_executor() -> ThreadPoolExecutor:
+    """Return the thread pool shared by every fan-out in this process"""
+    metrics.register_collector("fanout", fanout_stats)
+    return ThreadPoolExecutor(max_workers=int(os.environ.get("DREAM_FANOUT_WORKERS", "32")), thread_name_prefix="dream-fanout")
+
+
+class SectionFanout:
+    """Request interpretation sections concurrently, hedging slow ones on a second backend"""
+
+    def __init__(
+        self,
+        primary: HTTPBackend,
+        secondary: Optional[HTTPBackend] = None,
+        hedge_percentile: float = 95.0,
+        hedge_delay: float = 2.0,
+        min_hedge_delay: float = 0.05,
+        section_timeout: Optional[float] = None,
+    ):
+        self.primary = primary
+        self.secondary = secondary
+        self.hedge_percentile = hedge_percentile
+        self.hedge_delay = hedge_delay  # Used until the primary has a latency history
+        self.min_hedge_delay = min_hedge_delay
+        self.section_timeout = section_timeout if section_timeout is not None else primary.deadline
+
+    def current_hedge_delay(self) -> float:
+        """How long a section may run on the primary before it is hedged"""
+        observed = latency_tracker(self.primary.name, self.primary.model).percentile(self.hedge_percentile)
+        return max(self.min_hedge_delay, observed if observed is not None else self.hedge_delay)
+
+    def _call(self, backend: HTTPBackend, dream_text: str, language: str, guidelines: Dict, section: str):
+        started = time.monotonic()
+        value = backend.interpret(dream_text, language, guidelines, sections=(section,), holds_slot=True)[section]
+        latency_tracker(backend.name, backend.model).record(time.monotonic() - started)
+        return value
+
+    def iter_sections(
+        self, dream_text: str, language: str, guidelines: Dict, sections: Tuple[str, ...]
+    ) -> Iterator[Tuple[str, object]]:
+        """Yield (section, value) as sections finish; sections missing at the timeout are left out"""
+        executor = get_fanout_executor()
+        started = time.monotonic()
+        # A slot per section, reserved together so a fan-out never waits on its own sections
+        self.primary.admission.acquire(self.section_timeout, slots=len(sections), token=False)
+        deadline = started + self.section_timeout
+        hedge_at = started + self.current_hedge_delay()
+        pending: Dict[Future, Tuple[str, bool]] = {}  # future -> (section, is hedge)
+        hedged, done_sections = set(), set()
+
+        def submit(backend, section, is_hedge):
+            future = executor.submit(self._call, backend, dream_text, language, guidelines, section)
+            # Each call gives its slot back when it finishes, even after the fan-out has moved on
+            future.add_done_callback(lambda _: backend.admission.release())
+            pending[future] = (section, is_hedge)
+
+        def hedge(section):
+            if self.secondary is not None and section not in hedged:
+                try:
+                    # Hedges only go out when the secondary has a slot free right away
+                    self.secondary.admission.acquire(0, token=False)
+                except BackendError:
+                    return
+                hedged.add(section)
+                _count("hedged")
+                submit(self.secondary, section, True)
+
+        for section in sections:
+            submit(self.primary, section, False)
+        _count("sections", len(sections))
+
+        try:
+            while pending and len(done_sections) < len(sections):
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                if now >= hedge_at:
+                    for section in sections:
+                        if section not in done_sections:
+                            hedge(section)
+                wake = deadline if now >= hedge_at or self.secondary is None else min(hedge_at, deadline)
+                finished, _ = wait(pending, timeout=wake - now, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    section, is_hedge = pending.pop(future)
+                    if section in done_sections:
+                        continue
+                    try:
+                        value = future.result()
+                    except BackendError as e:
+                        logger.info("%s section %s failed: %s", "Hedged" if is_hedge else "Primary", section, e)
+                        # A failed primary is hedged at once instead of waiting for the delay
+                        if not is_hedge:
+                            hedge(section)
+                        continue
+                    done_sections.add(section)
+                    if is_hedge:
+                        _count("hedge_wins")
+                    yield section, value
+        finally:
+            # Calls already running cannot be interrupted; their results are dropped
+            for future in pending:
+                future.cancel()
+            missing = len(sections) - len(done_sections)
+            if missing:
+                _count("timed_out" if time.monotonic() >= deadline else "failed", missing)
+
+    def interpret(self, dream_text: str, language: str, guidelines: Dict, sections: Tuple[str, ...]) -> Dict:
+        """Collect the sections that finished in time"""
+        return dict(self.iter_sections(dream_text, language, guidelines, sections))
+
+
+def fanout_from_env(primary: Optional[HTTPBackend], apis: Dict[str, str]) -> Optional[SectionFanout]:
+    """Create the section fan-out when DREAM_FANOUT is set, hedging on the DREAM_HEDGE_BACKEND backend if any"""
+    if primary is None or os.environ.get("DREAM_FANOUT", "").lower() not in ("1", "true", "yes"):
+        return None
+    if primary.admission.concurrency < len(INTERPRETATION_KEYS):
+        logger.warning(
+            "DREAM_FANOUT needs %d concurrent %s requests but DREAM_%s_CONCURRENCY allows %d; fan-out is off",
+            len(INTERPRETATION_KEYS), primary.name, primary.name.upper(), primary.admission.concurrency,
+        )
+        return None
+    options = {}
+    for option, variable in [
+        ("hedge_percentile", "DREAM_HEDGE_PERCENTILE"),
+        ("hedge_delay", "DREAM_HEDGE_DELAY"),
+        ("section_timeout", "DREAM_SECTION_TIMEOUT"),
+    ]:
+        if os.environ.get(variable):
+            options[option] = float(os.environ[variable])
+    return SectionFanout(primary, backend_from_env(apis, "DREAM_HEDGE_BACKEND"), **options)
@@ -0,0 +1,332 @@
+import argparse
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from dream_metrics import metrics, timed
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dreams (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    language TEXT NOT NULL,
+    tone TEXT NOT NULL,
+    themes TEXT NOT NULL,
+    dream_text TEXT NOT NULL,
+    interpretation TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS dreams_by_user ON dreams (user_id, created_at, id);
+CREATE TABLE IF NOT EXISTS dream_themes (
+    theme TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    dream_id INTEGER NOT NULL,
+    PRIMARY KEY (theme, created_at, dream_id)
+) WITHOUT ROWID;
+"""
+
+SUMMARY_COLUMNS = "d.id, d.user_id, d.created_at, d.language, d.tone, d.themes, d.dream_text"
+# Records still waiting for the writer are keyed above every written id, in the order they were queued
+PENDING_ID_BASE = 1 << 62
+
+# Walk the distinct themes with index seeks, then count each theme's date range with a seek of its own
+THEME_COUNTS = """
+WITH RECURSIVE themes(theme) AS (
+    SELECT MIN(theme) FROM dream_themes
+    UNION ALL
+    SELECT (SELECT MIN(theme) FROM dream_themes WHERE theme > themes.theme) FROM themes WHERE theme IS NOT NULL
+)
+SELECT theme, (
+    SELECT COUNT(*) FROM dream_themes t WHERE t.theme = themes.theme AND t.created_at >= ? AND t.created_at < ?
+) FROM themes WHERE theme IS NOT NULL
+"""
+
+
+class HistoryPage(NamedTuple):
+    entries: List[Dict]
+    cursor: Optional[str]  # Pass back for the next page; None on the last page
+
+
+def _entry(row: Sequence) -> Dict:
+    entry = {
+        "id": row[0] if row[0] < PENDING_ID_BASE else None,
+        "user_id": row[1],
+        "created_at": row[2],
+        "language": row[3],
+        "tone": row[4],
+        "themes": json.loads(row[5]),
+        "dream_text": row[6],
+    }
+    if len(row) > 7:
+        entry["interpretation"] = json.loads(row[7])
+    return entry
+
+
+def _parse_cursor(cursor: Optional[str]) -> Tuple[float, int]:
+    if not cursor:
+        return float("inf"), 0
+    created_at, dream_id = cursor.rsplit(":", 1)
+    return float(created_at), int(dream_id)
+
+
+def _page(rows: List[Sequence], limit: int) -> HistoryPage:
+    # One extra row was fetched to tell whether another page follows
+    entries = [_entry(row) for row in rows[:limit]]
+    last = rows[limit - 1] if len(rows) > limit else None
+    cursor = f"{last[2]!r}:{last[0]}" if last is not None else None
+    return HistoryPage(entries, cursor)
+
+
+class HistoryStore:
+    """Persistent dream history in SQLite (WAL) with batched writes and keyset-paginated queries"""
+
+    def __init__(self, path: str, batch_size: int = 64, flush_interval: float = 0.5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.flushes = 0
+        self._pending: List[Tuple[int, Tuple]] = []  # (queue sequence, row)
+        self._queued = 0
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+        self._closed = False
+
+        self._db = self._connect()
+        self._db.executescript(SCHEMA)
+        self._writer = threading.Thread(target=self._write_loop, name="dream-history-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        # WAL keeps the database consistent without syncing every commit
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def _reader(self) -> sqlite3.Connection:
+        """One connection per reading thread, so queries run alongside the writer"""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = self._connect()
+        return db
+
+    def record(
+        self,
+        dream_text: str,
+        language: str,
+        interpretation: Dict,
+        themes: Sequence[str],
+        tone: str,
+        user_id: str = "anonymous",
+        created_at: Optional[float] = None,
+    ):
+        """Queue an interpretation for the next batched write"""
+        row = (
+            user_id,
+            time.time() if created_at is None else created_at,
+            language,
+            tone,
+            json.dumps(list(themes), ensure_ascii=False),
+            dream_text,
+            json.dumps(dict(interpretation), ensure_ascii=False),
+        )
+        with self._condition:
+            self._pending.append((self._queued, row))
+            self._queued += 1
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify()
+
+    @timed("history_flush")
+    def flush(self) -> int:
+        """Write every queued record in one transaction and return how many were written"""
+        with self._write_lock:
+            with self._condition:
+                rows, self._pending = [row for _, row in self._pending], []
+            if not rows:
+                return 0
+            with self._db:
+                for row in rows:
+                    dream_id = self._db.execute(
+                        "INSERT INTO dreams (user_id, created_at, language, tone, themes, dream_text, interpretation) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        row,
+                    ).lastrowid
+                    self._db.executemany(
+                        "INSERT OR IGNORE INTO dream_themes (theme, created_at, dream_id) VALUES (?, ?, ?)",
+                        [(theme, row[1], dream_id) for theme in json.loads(row[4])],
+                    )
+            self.written += len(rows)
+            self.flushes += 1
+            return len(rows)
+
+    def _write_loop(self):
+        while True:
+            with self._condition:
+                # Wake early once a full batch is queued
+                if len(self._pending) < self.batch_size and not self._closed:
+                    self._condition.wait(self.flush_interval)
+                closed = self._closed
+            try:
+                self.flush()
+            except sqlite3.Error:
+                logger.exception("Failed to write dream history to %s", self.path)
+            if closed:
+                return
+
+    def close(self):
+        """Write what is queued and stop the writer"""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        self._writer.join()
+
+    @timed("history_query")
+    def user_dreams(self, user_id: str, limit: int = 20, cursor: Optional[str] = None) -> HistoryPage:
+        """A user's dreams, newest first, including those still waiting for the writer"""
+        created_at, dream_id = _parse_cursor(cursor)
+        rows = self._reader().execute(
+            f"SELECT {SUMMARY_COLUMNS} FROM dreams d "
+            "WHERE d.user_id = ? AND (d.created_at, d.id) < (?, ?) "
+            "ORDER BY d.created_at DESC, d.id DESC LIMIT ?",
+            (user_id, created_at, dream_id, limit + 1),
+        ).fetchall()
+        # Merged in memory rather than flushed, so a user sees a dream right after submitting it
+        with self._condition:
+            pending = [
+                (PENDING_ID_BASE + sequence, *row[:6])
+                for sequence, row in self._pending
+                if row[0] == user_id and (row[1], PENDING_ID_BASE + sequence) < (created_at, dream_id)
+            ]
+        if pending:
+            rows = sorted(pending + rows, key=lambda row: (row[2], row[0]), reverse=True)
+        return _page(rows, limit)
+
+    @timed("history_query")
+    def dreams_with_theme(
+        self,
+        theme: str,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+    ) -> HistoryPage:
+        """Dreams with a theme created in [since, until), newest first"""
+        # created_at < until is (created_at, id) < (until, 0), so the cursor and the range end share one bound
+        before = _parse_cursor(cursor)
+        if until is not None:
+            before = min(before, (until, 0))
+        rows = self._reader().execute(
+            f"SELECT {SUMMARY_COLUMNS} FROM dream_themes t JOIN dreams d ON d.id = t.dream_id "
+            "WHERE t.theme = ? AND t.created_at >= ? AND (t.created_at, t.dream_id) < (?, ?) "
+            "ORDER BY t.created_at DESC, t.dream_id DESC LIMIT ?",
+            (theme, float("-inf") if since is None else since, *before, limit + 1),
+        ).fetchall()
+        return _page(rows, limit)
+
+    def get(self, dream_id: int) -> Optional[Dict]:
+        """One dream with its full interpretation"""
+        row = self._reader().execute(
+            f"SELECT {SUMMARY_COLUMNS}, d.interpretation FROM dreams d WHERE d.id = ?", (dream_id,)
+        ).fetchone()
+        return _entry(row) if row is not None else None
+
+    def entries(self, dream_ids: Sequence[int]) -> Dict[int, Dict]:
+        """Summaries of the given dreams by id, without their interpretations"""
+        if not dream_ids:
+            return {}
+        rows = self._reader().execute(
+            f"SELECT {SUMMARY_COLUMNS} FROM dreams d WHERE d.id IN ({', '.join('?' * len(dream_ids))})", list(dream_ids)
+        ).fetchall()
+        return {row[0]: _entry(row) for row in rows}
+
+    def theme_counts(self, since: Optional[float] = None, until: Optional[float] = None) -> Dict[str, int]:
+        """Number of dreams per theme created in [since, until), from the theme index alone"""
+        rows = self._reader().execute(
+            THEME_COUNTS, (float("-inf") if since is None else since, float("inf") if until is None else until)
+        ).fetchall()
+        return {theme: count for theme, count in rows if count}
+
+    def stats(self) -> Dict[str, int]:
+        with self._condition:
+            pending = len(self._pending)
+        return {"written": self.written, "flushes": self.flushes, "pending": pending}
+
+
+@lru_cache(maxsize=None)
+def get_history_store() -> Optional[HistoryStore]:
+    """Return the history store shared by every session, or None unless DREAM_HISTORY_PATH is set"""
+    path = os.environ.get("DREAM_HISTORY_PATH")
+    if not path:
+        return None
+    store = HistoryStore(
+        path,
+        batch_size=int(os.environ.get("DREAM_HISTORY_BATCH", "64")),
+        flush_interval=float(os.environ.get("DREAM_HISTORY_FLUSH_INTERVAL", "0.5")),
+    )
+    metrics.register_collector("history", store.stats)
+    return store
+
+
+def _timestamp(value: str) -> float:
+    """Accept epoch seconds or an ISO date such as 2024-05-01"""
+    try:
+        return float(value)
+    except ValueError:
+        return time.mktime(time.strptime(value, "%Y-%m-%d"))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Look up the dream history")
+    parser.add_argument("--path", default=os.environ.get("DREAM_HISTORY_PATH"), required=not os.environ.get("DREAM_HISTORY_PATH"))
+    commands = parser.add_subparsers(dest="command", required=True)
+    user = commands.add_parser("user", help="a user's dreams, newest first")
+    user.add_argument("user_id")
+    theme = commands.add_parser("theme", help="dreams with a theme, newest first")
+    theme.add_argument("theme")
+    theme.add_argument("--since", type=_timestamp, default=None, help="epoch seconds or YYYY-MM-DD")
+    theme.add_argument("--until", type=_timestamp, default=None, help="epoch seconds or YYYY-MM-DD")
+    for command in (user, theme):
+        command.add_argument("-n", "--limit", type=int, default=20)
+        command.add_argument("--cursor", default=None, help="cursor printed by the previous page")
+    show = commands.add_parser("show", help="one dream with its interpretation")
+    show.add_argument("dream_id", type=int)
+    counts = commands.add_parser("counts", help="dreams per theme")
+    counts.add_argument("--since", type=_timestamp, default=None)
+    counts.add_argument("--until", type=_timestamp, default=None)
+    args = parser.parse_args(argv)
+
+    store = HistoryStore(args.path)
+    sys.stdout.reconfigure(encoding="utf-8")
+    if args.command == "show":
+        print(json.dumps(store.get(args.dream_id), ensure_ascii=False, indent=2))
+        return 0
+    if args.command == "counts":
+        print(json.dumps(store.theme_counts(args.since, args.until), ensure_ascii=False, indent=2))
+        return 0
+    if args.command == "user":
+        page = store.user_dreams(args.user_id, args.limit, args.cursor)
+    else:
+        page = store.dreams_with_theme(args.theme, args.since, args.until, args.limit, args.cursor)
+    for entry in page.entries:
+        print(json.dumps(entry, ensure_ascii=False))
+    if page.cursor:
+        print(f"next page: --cursor {page.cursor}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,207 +2,442 @@ import streamlit as st
 import requests
 import json
 import re
-from typing import Dict, List, Tuple
 import time
+import uuid
+from collections.abc import Mapping
+from functools import partial
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from dream_backends import INTERPRETATION_KEYS, LIST_SECTIONS, BackendError, StreamEvent, backend_from_env
+from dream_cache import cache_key, get_interpretation_cache, get_single_flight, normalize_dream_text
+from dream_fanout import fanout_from_env
+from dream_history import get_history_store
+from dream_journal import JournalTimeline, LiveScan, iter_segments, tone_of
+from dream_lexicon import freeze, get_lexicon, scan_dream
+from dream_matcher import DreamScan
+from dream_metrics import deep_sizeof, metrics, stage, timed
+from dream_render import STYLE, interpretation_fingerprint, render_analysis_layout, rendered_interpretation, section_html
+from dream_similarity import get_similar_dreams
+
+# Longer dreams are read as journals: segment by segment, with a theme timeline
+LONG_DREAM_CHARS = 5000
+# How often the live preview picks up edits held back by its debounce
+LIVE_PREVIEW_INTERVAL = 1.0
+
+HISTORY_PAGE_SIZE = 5
+
+SIMILAR_DREAMS = 3
+SIMILAR_MIN_SCORE = 0.2
+
+API_ENDPOINTS = freeze({
+    "openai": "https://api.openai.com/v1/chat/completions",
+    "huggingface": "https://api-inference.huggingface.co/models",
+})
+
+ISLAMIC_GUIDELINES = freeze({
+    "types_of_dreams": [
+        "**True Dreams (Ru'ya)**: From Allah - good news and guidance",
+        "**Bad Dreams (Hulum)**: From Shaytan - seek refuge in Allah",
+        "**Dreams from self**: Reflections of daily thoughts and experiences"
+    ],
+    "interpretation_rules": [
+        "Consider the dreamer's circumstances and character",
+        "Interpret symbols according to Islamic tradition",
+        "Good dreams should be shared, bad dreams should not",
+        "Dreams are one of 46 parts of Prophethood",
+        "Context and emotions matter in interpretation"
+    ],
+    "scholars_methodology": {
+        "ibn_sirin": "Combined Quran, Sunnah, Arabic language, and psychological insight",
+        "nabulsi": "Emphasized spiritual dimensions and soul's reflections"
+    }
+})
+
+# Fixed text around the per-theme lines of each lexicon-driven section, by (section, language)
+THEME_SECTIONS = freeze({
+    ("ibn_sirin_analysis", "english"): {
+        "head": "According to Ibn Sirin's methodology:\n\n",
+        "line": "• {text}\n",
+        "tail": "\nIbn Sirin would consider your personal circumstances and the dream's context. The emotional tone suggests {guidance}",
+    },
+    ("ibn_sirin_analysis", "urdu"): {
+        "head": "امام ابن سیرین کے طریقہ تعبیر کے مطابق:\n\n",
+        "line": "• {text}\n",
+        "tail": "\nابن سیرین آپ کے ذاتی حالات اور خواب کے سیاق و سباق کو مدنظر رکھتے ہوئے تعبیر دیں گے۔",
+    },
+    ("nabulsi_analysis", "english"): {
+        "head": "According to Sheikh Nabulsi's spiritual approach:\n\n",
+        "line": "• {text}\n",
+        "tail": "\nNabulsi would emphasize the dream's spiritual dimensions and what Allah might be communicating through these symbols.",
+    },
+    ("nabulsi_analysis", "urdu"): {
+        "head": "شیخ عبدالغنی نابلسی کے روحانی طریقہ تعبیر کے مطابق:\n\n",
+        "line": "• {text}\n",
+        "tail": "\nنابلسی خواب کے روحانی پہلوؤں پر زور دیتے ہیں کہ اللہ تعالیٰ ان علامات کے ذریعے کیا پیغام دے رہے ہیں۔",
+    },
+    ("symbolic_meanings", "english"): {
+        "line": "{title}: {text}",
+        "empty": ["The dream contains general symbols that should be interpreted in context"],
+    },
+    ("symbolic_meanings", "urdu"): {
+        "line": "{title}: {text}",
+        "empty": ["خواب میں عمومی علامات ہیں جنہیں سیاق و سباق میں سمجھنا چاہیے"],
+    },
+    ("practical_advice", "english"): {
+        "line": "{text}",
+        "tail": ["Share good dreams with loved ones", "Seek refuge in Allah from any disturbing elements"],
+    },
+    ("practical_advice", "urdu"): {
+        "line": "{text}",
+        "tail": ["اچھے خواب اپنے پیاروں کے ساتھ شیئر کریں", "ہر پریشان کن عنصر سے اللہ کی پناہ مانگیں"],
+    },
+})
+
+def normalize_language(language: Optional[str]) -> str:
+    """Lowercase a language name, defaulting to English"""
+    return (language or "").strip().lower() or "english"
+
+class LazyInterpretation(Mapping):
+    """Interpretation mapping whose sections are computed on first access and memoized"""
+    
+    def __init__(self, builders: Dict[str, Callable]):
+        self._builders = builders
+        self._values = {}
+    
+    def __getitem__(self, section: str):
+        if section not in self._values:
+            value = self._builders[section]()
+            self._values.setdefault(section, value)
+        return self._values[section]
+    
+    def __iter__(self):
+        return iter(self._builders)
+    
+    def __len__(self) -> int:
+        return len(self._builders)
+    
+    def computed(self) -> List[str]:
+        """Sections that have been computed so far"""
+        return [section for section in self._builders if section in self._values]
+    
+    def __repr__(self) -> str:
+        return f"LazyInterpretation(sections={list(self._builders)}, computed={self.computed()})"
 
 class AdvancedDreamInterpreter:
-    def __init__(self):
+    def __init__(self, backend=None, cache=None):
         self.setup_apis()
         self.islamic_guidelines = self.get_islamic_guidelines()
+        self.backend = backend if backend is not None else backend_from_env(self.apis)
+        self.cache = cache if cache is not None else get_interpretation_cache()
+        self.inflight = get_single_flight()
+        # Optional concurrent per-section requests, hedged on a second backend
+        self.fanout = fanout_from_env(self.backend, self.apis)
     
     def setup_apis(self):
         """Setup API endpoints for AI models"""
-        self.apis = {
-            "openai": "https://api.openai.com/v1/chat/completions",
-            "huggingface": "https://api-inference.huggingface.co/models",
-        }
+        self.apis = API_ENDPOINTS
     
     def get_islamic_guidelines(self):
         """Islamic guidelines for dream interpretation"""
-        return {
-            "types_of_dreams": [
-                "**True Dreams (Ru'ya)**: From Allah - good news and guidance",
-                "**Bad Dreams (Hulum)**: From Shaytan - seek refuge in Allah",
-                "**Dreams from self**: Reflections of daily thoughts and experiences"
-            ],
-            "interpretation_rules": [
-                "Consider the dreamer's circumstances and character",
-                "Interpret symbols according to Islamic tradition",
-                "Good dreams should be shared, bad dreams should not",
-                "Dreams are one of 46 parts of Prophethood",
-                "Context and emotions matter in interpretation"
-            ],
-            "scholars_methodology": {
-                "ibn_sirin": "Combined Quran, Sunnah, Arabic language, and psychological insight",
-                "nabulsi": "Emphasized spiritual dimensions and soul's reflections"
-            }
-        }
-    
-    def analyze_dream_with_ai(self, dream_text: str, language: str = "english") -> Dict:
-        """Analyze dream using AI with Islamic context"""
+        return ISLAMIC_GUIDELINES
+    
+    @timed
+    def analyze_dream_with_ai(
+        self,
+        dream_text: str,
+        language: str = "english",
+        lazy: bool = False,
+        sections: Optional[List[str]] = None,
+        user_id: Optional[str] = None,
+    ) -> Dict:
+        """Analyze dream using AI with Islamic context (user_id: whose near-identical past dreams may be reused)"""
+        language = normalize_language(language)
+        
+        # Lazy or partial interpretations only pay for the sections actually read
+        if lazy or sections is not None:
+            interpretation = self.analyze_dream_lazily(dream_text, language, sections)
+            return interpretation if lazy else dict(interpretation)
+        
+        if self.backend is not None:
+            key = self._cache_key(dream_text, language, self.backend)
+            try:
+                # Concurrent sessions submitting the same dream share one backend round-trip
+                return self.inflight.do(
+                    key,
+                    lambda: self._interpret_with_backend(key, dream_text, language, user_id),
+                    timeout=self.backend.deadline
+                )
+            except (BackendError, TimeoutError):
+                pass  # Slow or unavailable backend: fall back to rule-based interpretation
+        
+        key = self._cache_key(dream_text, language)
+        interpretation = self.cache.get(key)
+        if interpretation is not None:
+            return interpretation
         
         if language == "urdu":
-            return self._generate_urdu_interpretation(dream_text)
+            interpretation = self._generate_urdu_interpretation(dream_text)
         else:
-            return self._generate_english_interpretation(dream_text)
+            interpretation = self._generate_english_interpretation(dream_text)
+        self.cache.set(key, interpretation)
+        return interpretation
+    
+    def analyze_dream_with_ai_stream(
+        self, dream_text: str, language: str = "english", scan: Optional[DreamScan] = None, user_id: Optional[str] = None
+    ) -> Iterator[StreamEvent]:
+        """Stream the interpretation section by section, with model tokens as they arrive (scan: an up-to-date scan of dream_text)"""
+        language = normalize_language(language)
+        finished = {}
+        if self.backend is not None:
+            key = self._cache_key(dream_text, language, self.backend)
+            flight, leader = self.inflight.begin(key)
+            if leader:
+                yield from self._lead_backend_stream(dream_text, language, key, flight, finished, user_id)
+            else:
+                try:
+                    for section, value in self.inflight.wait(flight, self.backend.deadline).items():
+                        finished[section] = value
+                        yield StreamEvent("section", section, value)
+                except (BackendError, TimeoutError):
+                    pass  # Fall back to the rules below, like the leader did
+            if len(finished) == len(INTERPRETATION_KEYS):
+                return
+        
+        # Partial backend answers are completed from the rules but never cached
+        if finished:
+            for section, build in self._section_builders(dream_text, language, scan).items():
+                if section not in finished:
+                    yield StreamEvent("section", section, build())
+            return
+        
+        key = self._cache_key(dream_text, language)
+        interpretation = self.cache.get(key)
+        if interpretation is None:
+            interpretation = {}
+            for section, build in self._section_builders(dream_text, language, scan).items():
+                interpretation[section] = build()
+                yield StreamEvent("section", section, interpretation[section])
+            self.cache.set(key, interpretation)
+        else:
+            for section, value in interpretation.items():
+                yield StreamEvent("section", section, value)
+    
+    def analyze_journal_stream(self, journal: Union[str, Iterable[str]], language: str = "english") -> Iterator[StreamEvent]:
+        """Stream a long journal (text or text chunks) segment by segment, then its merged interpretation"""
+        # Rule-based only: a multi-page journal would not fit a single backend prompt
+        language = normalize_language(language)
+        timeline = JournalTimeline()
+        for start, text in iter_segments(journal):
+            yield StreamEvent("segment", None, timeline.add(start, text))
+        for section, build in self._section_builders("", language, timeline.scan()).items():
+            yield StreamEvent("section", section, build())
+        yield StreamEvent("section", "timeline", timeline.summary())
+    
+    def analyze_journal(self, journal: Union[str, Iterable[str]], language: str = "english") -> Dict:
+        """Interpret a long journal in one bounded-memory pass, adding a theme and tone timeline"""
+        return {event.section: event.data for event in self.analyze_journal_stream(journal, language) if event.kind == "section"}
+    
+    def analyze_dream_lazily(
+        self, dream_text: str, language: str = "english", sections: Optional[List[str]] = None
+    ) -> LazyInterpretation:
+        """Return an interpretation that computes each requested section on first access"""
+        language = normalize_language(language)
+        sections = list(sections) if sections is not None else list(INTERPRETATION_KEYS)
+        unknown = [section for section in sections if section not in INTERPRETATION_KEYS]
+        if unknown:
+            raise ValueError(f"Unknown interpretation sections: {', '.join(unknown)}")
+        
+        rule_builders = self._section_builders(dream_text, language)
+        return LazyInterpretation({
+            section: partial(self._lazy_section, dream_text, language, section, rule_builders[section])
+            for section in sections
+        })
+    
+    def _lazy_section(self, dream_text: str, language: str, section: str, build: Callable):
+        """Compute one section from the backend if configured, falling back to the rules"""
+        if self.backend is None:
+            return build()
+        key = self._cache_key(dream_text, language, self.backend)
+        try:
+            return self.inflight.do(
+                f"{key}:{section}",
+                lambda: self._interpret_section_with_backend(key, dream_text, language, section),
+                timeout=self.backend.deadline
+            )
+        except (BackendError, TimeoutError):
+            return build()
+    
+    def _interpret_section_with_backend(self, key: str, dream_text: str, language: str, section: str):
+        """Return one backend section, from the cached full interpretation if any, else asking the backend for just that section"""
+        interpretation = self.cache.get(key)
+        if interpretation is not None and section in interpretation:
+            return interpretation[section]
+        section_key = f"{key}:{section}"
+        cached = self.cache.get(section_key)
+        if cached is None:
+            cached = self.backend.interpret(dream_text, language, self.islamic_guidelines, sections=(section,))
+            self.cache.set(section_key, cached)
+        return cached[section]
+    
+    def _interpret_with_backend(self, key: str, dream_text: str, language: str, user_id: Optional[str] = None) -> Dict:
+        """Return the cached backend interpretation, asking the backend on a miss"""
+        interpretation = self.cache.get(key)
+        if interpretation is None:
+            interpretation = self._reuse_near_duplicate(key, dream_text, language, user_id)
+        if interpretation is None:
+            if self.fanout is not None:
+                sections = self.fanout.interpret(dream_text, language, self.islamic_guidelines, INTERPRETATION_KEYS)
+                if len(sections) < len(INTERPRETATION_KEYS):
+                    # Sections that timed out fall back to the rules, and the mix is not cached
+                    builders = self._section_builders(dream_text, language)
+                    return {section: sections[section] if section in sections else builders[section]() for section in INTERPRETATION_KEYS}
+                interpretation = {section: sections[section] for section in INTERPRETATION_KEYS}
+            else:
+                interpretation = self.backend.interpret(dream_text, language, self.islamic_guidelines)
+            self.cache.set(key, interpretation)
+        return interpretation
+    
+    def _lead_backend_stream(
+        self, dream_text: str, language: str, key: str, flight, finished: Dict, user_id: Optional[str] = None
+    ) -> Iterator[StreamEvent]:
+        """Stream from the backend as flight leader and publish the outcome to coalesced waiters"""
+        interpretation = self.cache.get(key)
+        if interpretation is None:
+            interpretation = self._reuse_near_duplicate(key, dream_text, language, user_id)
+        if interpretation is not None:
+            self.inflight.finish(key, flight, interpretation)
+            for section, value in interpretation.items():
+                finished[section] = value
+                yield StreamEvent("section", section, value)
+            return
+        
+        error = None
+        try:
+            try:
+                if self.fanout is not None:
+                    sections = self.fanout.iter_sections(dream_text, language, self.islamic_guidelines, INTERPRETATION_KEYS)
+                    events = (StreamEvent("section", section, value) for section, value in sections)
+                else:
+                    events = self.backend.stream(dream_text, language, self.islamic_guidelines)
+                for event in events:
+                    if event.kind == "section":
+                        finished[event.section] = event.data
+                    yield event
+            except BackendError as e:
+                error = e  # The caller fills the sections the backend did not finish
+            if len(finished) == len(INTERPRETATION_KEYS):
+                interpretation = {section: finished[section] for section in INTERPRETATION_KEYS}
+                self.cache.set(key, interpretation)
+        finally:
+            # Release the waiters even if the consumer stops iterating early
+            if interpretation is None and error is None:
+                error = BackendError(f"{self.backend.name} returned an incomplete interpretation")
+            self.inflight.finish(key, flight, interpretation, error)
+    
+    def cached_interpretation(self, dream_text: str, language: str) -> Optional[Dict]:
+        """The cached interpretation of a dream: the backend's if it answered in full, else the rules'"""
+        language = normalize_language(language)
+        keys = [self._cache_key(dream_text, language)]
+        if self.backend is not None:
+            keys.insert(0, self._cache_key(dream_text, language, self.backend))
+        for key in keys:
+            interpretation = self.cache.get(key)
+            if interpretation is not None:
+                return interpretation
+        return None
+    
+    def _reuse_near_duplicate(self, key: str, dream_text: str, language: str, user_id: Optional[str]) -> Optional[Dict]:
+        """Cache and return the backend interpretation of a near-identical past dream of the user, if one is cached"""
+        # Rule-based interpretations are cheaper to rebuild than to search for
+        similar = get_similar_dreams()
+        if similar is None:
+            return None
+        for past_text in similar.near_duplicates(dream_text, scan_dream(dream_text), user_id):
+            interpretation = self.cache.get(self._cache_key(past_text, language, self.backend))
+            if interpretation is not None:
+                similar.count_reuse()
+                self.cache.set(key, interpretation)
+                return interpretation
+        return None
+    
+    def _cache_key(self, dream_text: str, language: str, backend=None) -> str:
+        """Key the shared cache by dream, language and the backend or lexicon version"""
+        if backend is None:
+            version = f"rules:{get_lexicon().version}"
+        else:
+            version = f"{backend.name}:{backend.model}"
+        return cache_key(dream_text, language, version)
+    
+    def _section_builders(self, dream_text: str, language: str, scan: Optional[DreamScan] = None) -> Dict[str, Callable]:
+        """Map each interpretation section to the rule-based builder producing it"""
+        if scan is None:
+            scan = scan_dream(dream_text)
+        themes = self._detect_dream_themes(scan)
+        # The rules are written in English and Urdu; any other language gets the English texts
+        language = "urdu" if normalize_language(language) == "urdu" else "english"
+        render = partial(self._render_theme_section, scan=scan, language=language, themes=themes)
+        
+        if language == "urdu":
+            summary = lambda: self._generate_urdu_summary(scan, themes)
+            guidance = lambda: self._generate_urdu_spiritual_guidance(themes)
+            assessment = lambda: self._generate_urdu_overall_assessment(themes)
+        else:
+            summary = lambda: self._generate_summary(scan, themes)
+            guidance = lambda: self._generate_spiritual_guidance(themes)
+            assessment = lambda: self._generate_overall_assessment(themes)
+        
+        return {
+            "summary": summary,
+            "ibn_sirin_analysis": partial(render, "ibn_sirin_analysis"),
+            "nabulsi_analysis": partial(render, "nabulsi_analysis"),
+            "symbolic_meanings": partial(render, "symbolic_meanings"),
+            "practical_advice": partial(render, "practical_advice"),
+            "spiritual_guidance": guidance,
+            "overall_assessment": assessment
+        }
     
     def _generate_english_interpretation(self, dream_text: str) -> Dict:
         """Generate comprehensive English interpretation"""
-        
-        interpretation_template = {
-            "summary": "",
-            "ibn_sirin_analysis": "",
-            "nabulsi_analysis": "",
-            "symbolic_meanings": [],
-            "practical_advice": [],
-            "spiritual_guidance": [],
-            "overall_assessment": ""
-        }
-        
         # AI-powered analysis (simulated - in production, use actual AI API)
-        dream_lower = dream_text.lower()
-        
-        # Detect key themes
-        themes = self._detect_dream_themes(dream_lower)
-        
-        # Generate interpretations based on themes
-        interpretation_template["summary"] = self._generate_summary(dream_text, themes)
-        interpretation_template["ibn_sirin_analysis"] = self._generate_ibn_sirin_analysis(dream_text, themes)
-        interpretation_template["nabulsi_analysis"] = self._generate_nabulsi_analysis(dream_text, themes)
-        interpretation_template["symbolic_meanings"] = self._extract_symbolic_meanings(dream_text, themes)
-        interpretation_template["practical_advice"] = self._generate_practical_advice(themes)
-        interpretation_template["spiritual_guidance"] = self._generate_spiritual_guidance(themes)
-        interpretation_template["overall_assessment"] = self._generate_overall_assessment(themes)
-        
-        return interpretation_template
+        builders = self._section_builders(dream_text, "english")
+        return {section: build() for section, build in builders.items()}
     
     def _generate_urdu_interpretation(self, dream_text: str) -> Dict:
         """Generate comprehensive Urdu interpretation"""
-        
-        # Translate and analyze for Urdu output
-        themes = self._detect_dream_themes(dream_text.lower())
-        
-        urdu_interpretation = {
-            "summary": self._generate_urdu_summary(dream_text, themes),
-            "ibn_sirin_analysis": self._generate_urdu_ibn_sirin_analysis(themes),
-            "nabulsi_analysis": self._generate_urdu_nabulsi_analysis(themes),
-            "symbolic_meanings": self._extract_urdu_symbolic_meanings(themes),
-            "practical_advice": self._generate_urdu_practical_advice(themes),
-            "spiritual_guidance": self._generate_urdu_spiritual_guidance(themes),
-            "overall_assessment": self._generate_urdu_overall_assessment(themes)
-        }
-        
-        return urdu_interpretation
+        builders = self._section_builders(dream_text, "urdu")
+        return {section: build() for section, build in builders.items()}
     
-    def _detect_dream_themes(self, dream_text: str) -> List[str]:
+    @timed
+    def _detect_dream_themes(self, scan: DreamScan) -> List[str]:
         """Detect main themes in the dream"""
-        themes = []
-        
-        theme_keywords = {
-            "water": ["water", "river", "sea", "ocean", "rain", "drinking", "swimming"],
-            "animals": ["snake", "lion", "bird", "horse", "dog", "cat", "animal"],
-            "family": ["mother", "father", "parent", "child", "son", "daughter", "family"],
-            "death": ["death", "dead", "died", "funeral", "grave", "bury"],
-            "travel": ["travel", "journey", "road", "path", "car", "bus", "train"],
-            "house": ["house", "home", "room", "building", "door", "window"],
-            "nature": ["tree", "mountain", "sun", "moon", "sky", "flower"],
-            "money": ["money", "gold", "wealth", "rich", "poor", "coins"],
-            "food": ["food", "eating", "fruit", "meal", "hungry", "thirsty"],
-            "spiritual": ["prayer", "mosque", "quran", "allah", "prophet", "angel"]
-        }
-        
-        for theme, keywords in theme_keywords.items():
-            if any(keyword in dream_text for keyword in keywords):
-                themes.append(theme)
-        
+        themes = list(scan.themes)
         return themes if themes else ["general"]
     
-    def _generate_summary(self, dream_text: str, themes: List[str]) -> str:
+    def _render_theme_section(self, section: str, scan: DreamScan, language: str, themes: List[str]):
+        """Render a section from the lexicon texts of the detected themes only"""
+        with stage(f"render_{section}"):
+            frame = THEME_SECTIONS[section, language]
+            table = get_lexicon().theme_table
+            lines = []
+            for theme in themes:
+                text = table.get(theme, {}).get(section, {}).get(language)
+                if text is not None:
+                    lines.append(frame["line"].format(text=text, title=theme.title()))
+            
+            if section in LIST_SECTIONS:
+                return (lines or list(frame.get("empty", ()))) + list(frame.get("tail", ()))
+            tail = frame["tail"]
+            if "{guidance}" in tail:
+                tail = tail.format(guidance=self._get_emotional_guidance(scan))
+            return "".join([frame["head"], *lines, tail])
+    
+    @timed
+    def _generate_summary(self, scan: DreamScan, themes: List[str]) -> str:
         """Generate dream summary"""
         theme_desc = ", ".join(themes)
-        return f"This dream contains themes of {theme_desc}. The narrative suggests {self._get_emotional_tone(dream_text)}. Based on Islamic dream interpretation principles, this appears to be {self._assess_dream_type(dream_text)}."
-    
-    def _generate_ibn_sirin_analysis(self, dream_text: str, themes: List[str]) -> str:
-        """Generate analysis based on Ibn Sirin's methodology"""
-        analysis = "According to Ibn Sirin's methodology:\n\n"
-        
-        if "water" in themes:
-            analysis += "• Water elements indicate knowledge, life, and spiritual purity. Clear water suggests lawful earnings.\n"
-        if "animals" in themes:
-            analysis += "• Animals represent various aspects of life - snakes for enemies, birds for news, lions for authority.\n"
-        if "death" in themes:
-            analysis += "• Death in dreams usually signifies transformation or changes, not physical death.\n"
-        if "house" in themes:
-            analysis += "• Houses reflect the dreamer's life circumstances and spiritual state.\n"
-        if "travel" in themes:
-            analysis += "• Travel indicates seeking knowledge or life changes.\n"
-        
-        analysis += f"\nIbn Sirin would consider your personal circumstances and the dream's context. The emotional tone suggests {self._get_emotional_guidance(dream_text)}"
-        
-        return analysis
-    
-    def _generate_nabulsi_analysis(self, dream_text: str, themes: List[str]) -> str:
-        """Generate analysis based on Sheikh Nabulsi's methodology"""
-        analysis = "According to Sheikh Nabulsi's spiritual approach:\n\n"
-        
-        if "water" in themes:
-            analysis += "• Water represents divine mercy and spiritual nourishment. Its state reflects your spiritual condition.\n"
-        if "animals" in themes:
-            analysis += "• Animals symbolize inner states and spiritual challenges to overcome.\n"
-        if "death" in themes:
-            analysis += "• Death indicates spiritual transformation and rebirth into higher consciousness.\n"
-        if "house" in themes:
-            analysis += "• The house mirrors your soul's condition and spiritual journey.\n"
-        if "spiritual" in themes:
-            analysis += "• Spiritual elements show your connection with divine guidance.\n"
-        
-        analysis += f"\nNabulsi would emphasize the dream's spiritual dimensions and what Allah might be communicating through these symbols."
-        
-        return analysis
-    
-    def _extract_symbolic_meanings(self, dream_text: str, themes: List[str]) -> List[str]:
-        """Extract symbolic meanings from dream"""
-        symbols = []
-        
-        symbol_meanings = {
-            "water": "Life, knowledge, purity, divine mercy",
-            "snake": "Hidden enemies, temptations, or transformation",
-            "lion": "Power, authority, or personal strength",
-            "bird": "News, messages, or spiritual aspirations",
-            "death": "Transformation, endings, or new beginnings",
-            "house": "Self, life circumstances, or spiritual state",
-            "travel": "Journey, seeking, or life changes",
-            "tree": "Growth, life, or family connections",
-            "sun": "Guidance, knowledge, or divine light",
-            "moon": "Beauty, reflection, or feminine aspects"
-        }
-        
-        for theme in themes:
-            if theme in symbol_meanings:
-                symbols.append(f"{theme.title()}: {symbol_meanings[theme]}")
-        
-        return symbols if symbols else ["The dream contains general symbols that should be interpreted in context"]
-    
-    def _generate_practical_advice(self, themes: List[str]) -> List[str]:
-        """Generate practical advice based on dream themes"""
-        advice = []
-        
-        if "water" in themes:
-            advice.append("Reflect on your sources of knowledge and spiritual nourishment")
-        if "animals" in themes:
-            advice.append("Consider what challenges or 'enemies' you need to overcome")
-        if "death" in themes:
-            advice.append("What aspects of your life are transforming or need to change?")
-        if "travel" in themes:
-            advice.append("Are you seeking new knowledge or directions in life?")
-        if "money" in themes:
-            advice.append("Examine your relationship with wealth and provisions")
-        
-        advice.append("Share good dreams with loved ones")
-        advice.append("Seek refuge in Allah from any disturbing elements")
-        
-        return advice
+        return f"This dream contains themes of {theme_desc}. The narrative suggests {self._get_emotional_tone(scan)}. Based on Islamic dream interpretation principles, this appears to be {self._assess_dream_type(scan)}."
     
+    @timed
     def _generate_spiritual_guidance(self, themes: List[str]) -> List[str]:
         """Generate spiritual guidance"""
         guidance = [
@@ -214,84 +449,19 @@ class AdvancedDreamInterpreter:
         ]
         return guidance
     
+    @timed
     def _generate_overall_assessment(self, themes: List[str]) -> str:
         """Generate overall assessment"""
         return f"Based on the themes detected ({', '.join(themes)}), this dream appears to carry meaningful insights. Consider both the practical and spiritual dimensions in your reflection."
     
     # Urdu Interpretation Methods
-    def _generate_urdu_summary(self, dream_text: str, themes: List[str]) -> str:
+    @timed
+    def _generate_urdu_summary(self, scan: DreamScan, themes: List[str]) -> str:
         """Generate Urdu summary"""
         theme_desc = "، ".join(themes)
-        return f"یہ خواب {theme_desc} کے موضوعات پر مشتمل ہے۔ خواب کی کیفیت {self._get_urdu_emotional_tone(dream_text)}۔ اسلامی تعبیر کے اصولوں کے مطابق، یہ خواب {self._assess_urdu_dream_type(dream_text)} ظاہر ہوتا ہے۔"
-    
-    def _generate_urdu_ibn_sirin_analysis(self, themes: List[str]) -> str:
-        """Generate Urdu Ibn Sirin analysis"""
-        analysis = "امام ابن سیرین کے طریقہ تعبیر کے مطابق:\n\n"
-        
-        if "water" in themes:
-            analysis += "• پانی کے عناصر علم، زندگی اور روحانی پاکیزگی کی علامت ہیں۔ صاف پانی حلال روزی کی نشاندہی کرتا ہے۔\n"
-        if "animals" in themes:
-            analysis += "• جانور زندگی کے مختلف پہلوؤں کی نمائندگی کرتے ہیں - سانپ دشمن، پرندے خبریں، شیر حکمرانی۔\n"
-        if "death" in themes:
-            analysis += "• خواب میں موت عموماً تبدیلی یا حالات کی تبدیلی کی طرف اشارہ ہوتی ہے، جسمانی موت نہیں۔\n"
-        if "house" in themes:
-            analysis += "• گھر خواب دیکھنے والے کے حالات زندگی اور روحانی حالت کا آئینہ دار ہیں۔\n"
-        
-        analysis += "\nابن سیرین آپ کے ذاتی حالات اور خواب کے سیاق و سباق کو مدنظر رکھتے ہوئے تعبیر دیں گے۔"
-        
-        return analysis
-    
-    def _generate_urdu_nabulsi_analysis(self, themes: List[str]) -> str:
-        """Generate Urdu Nabulsi analysis"""
-        analysis = "شیخ عبدالغنی نابلسی کے روحانی طریقہ تعبیر کے مطابق:\n\n"
-        
-        if "water" in themes:
-            analysis += "• پانی divine رحمت اور روحانی غذا کی علامت ہے۔ اس کی حالت آپ کی روحانی کیفیت کو ظاہر کرتی ہے۔\n"
-        if "animals" in themes:
-            analysis += "• جانور اندرونی کیفیات اور روحانی چیلنجز کی نمائندگی کرتے ہیں۔\n"
-        if "death" in themes:
-            analysis += "• موت روحانی تبدیلی اور اعلی شعور میں نئے سرے سے جنم لینے کی علامت ہے۔\n"
-        
-        analysis += "\nنابلسی خواب کے روحانی پہلوؤں پر زور دیتے ہیں کہ اللہ تعالیٰ ان علامات کے ذریعے کیا پیغام دے رہے ہیں۔"
-        
-        return analysis
-    
-    def _extract_urdu_symbolic_meanings(self, themes: List[str]) -> List[str]:
-        """Extract Urdu symbolic meanings"""
-        symbols = []
-        
-        urdu_symbol_meanings = {
-            "water": "زندگی، علم، پاکیزگی، divine رحمت",
-            "snake": "پوشیدہ دشمن، آزمائشیں، یا تبدیلی",
-            "lion": "طاقت، حکمرانی، یا ذاتی قوت",
-            "bird": "خبریں، پیغامات، یا روحانی آرزوئیں",
-            "death": "تبدیلی، اختتام، یا نئے آغاز",
-            "house": "ذات، زندگی کے حالات، یا روحانی حالت",
-            "travel": "سفر، تلاش، یا زندگی میں تبدیلیاں"
-        }
-        
-        for theme in themes:
-            if theme in urdu_symbol_meanings:
-                symbols.append(f"{theme.title()}: {urdu_symbol_meanings[theme]}")
-        
-        return symbols if symbols else ["خواب میں عمومی علامات ہیں جنہیں سیاق و سباق میں سمجھنا چاہیے"]
-    
-    def _generate_urdu_practical_advice(self, themes: List[str]) -> List[str]:
-        """Generate Urdu practical advice"""
-        advice = []
-        
-        if "water" in themes:
-            advice.append("اپنے علم اور روحانی غذا کے ذرائع پر غور کریں")
-        if "animals" in themes:
-            advice.append("غور کریں کہ آپ کو کن چیلنجز یا 'دشمنوں' پر قابو پانا ہے")
-        if "death" in themes:
-            advice.append("آپ کی زندگی کے کن پہلوؤں میں تبدیلی آ رہی ہے یا ضرورت ہے؟")
-        
-        advice.append("اچھے خواب اپنے پیاروں کے ساتھ شیئر کریں")
-        advice.append("ہر پریشان کن عنصر سے اللہ کی پناہ مانگیں")
-        
-        return advice
+        return f"یہ خواب {theme_desc} کے موضوعات پر مشتمل ہے۔ خواب کی کیفیت {self._get_urdu_emotional_tone(scan)}۔ اسلامی تعبیر کے اصولوں کے مطابق، یہ خواب {self._assess_urdu_dream_type(scan)} ظاہر ہوتا ہے۔"
     
+    @timed
     def _generate_urdu_spiritual_guidance(self, themes: List[str]) -> List[str]:
         """Generate Urdu spiritual guidance"""
         guidance = [
@@ -303,62 +473,139 @@ class AdvancedDreamInterpreter:
         ]
         return guidance
     
+    @timed
     def _generate_urdu_overall_assessment(self, themes: List[str]) -> str:
         """Generate Urdu overall assessment"""
         theme_desc = "، ".join(themes)
         return f"معلوم ہونے والے موضوعات ({theme_desc}) کی بنیاد پر، یہ خواب meaningful insights رکھتا ظاہر ہوتا ہے۔ اپنے reflection میں practical اور spiritual دونوں پہلوؤں کو مدنظر رکھیں۔"
     
-    def _get_emotional_tone(self, dream_text: str) -> str:
+    def _get_emotional_tone(self, scan: DreamScan) -> str:
         """Detect emotional tone of dream"""
-        positive_words = ["happy", "peaceful", "joy", "beautiful", "calm", "blessed"]
-        negative_words = ["fear", "scared", "angry", "sad", "worried", "terrified"]
-        
-        if any(word in dream_text.lower() for word in positive_words):
+        if scan.has("tone", "positive"):
             return "positive and hopeful emotions"
-        elif any(word in dream_text.lower() for word in negative_words):
+        elif scan.has("tone", "negative"):
             return "challenging or concerning emotions"
         else:
             return "mixed or neutral emotions"
     
-    def _get_urdu_emotional_tone(self, dream_text: str) -> str:
+    def _get_urdu_emotional_tone(self, scan: DreamScan) -> str:
         """Detect Urdu emotional tone"""
-        positive_urdu = ["خوش", "پرسکون", "مسرور", "خوشی", "برکت"]
-        negative_urdu = ["خوف", "ڈر", "غصہ", "اداس", "پریشان"]
-        
-        if any(word in dream_text for word in positive_urdu):
+        if scan.has("tone", "positive"):
             return "مثبت اور پرامید جذبات"
-        elif any(word in dream_text for word in negative_urdu):
+        elif scan.has("tone", "negative"):
             return "چیلنجنگ یا پریشان کن جذبات"
         else:
             return "مخلوط یا neutral جذبات"
     
-    def _assess_dream_type(self, dream_text: str) -> str:
+    def _assess_dream_type(self, scan: DreamScan) -> str:
         """Assess type of dream"""
-        if any(word in dream_text.lower() for word in ["peace", "happy", "light", "beautiful", "blessing"]):
+        if scan.has("dream_type", "true"):
             return "a potentially true dream (Ru'ya) containing good news"
-        elif any(word in dream_text.lower() for word in ["fear", "dark", "monster", "chase", "falling"]):
+        elif scan.has("dream_type", "bad"):
             return "possibly from negative sources - seek refuge in Allah"
         else:
             return "a reflection of daily thoughts and experiences"
     
-    def _assess_urdu_dream_type(self, dream_text: str) -> str:
+    def _assess_urdu_dream_type(self, scan: DreamScan) -> str:
         """Assess Urdu dream type"""
-        if any(word in dream_text for word in ["پرسکون", "خوش", "روشنی", "خوشی", "برکت"]):
+        if scan.has("dream_type", "true"):
             return "ممکنہ طور پر سچا خواب (رویا) جو خوشخبری رکھتا ہے"
-        elif any(word in dream_text for word in ["خوف", "اندھیرا", "ڈراؤنا", "پیچھا", "گرنا"]):
+        elif scan.has("dream_type", "bad"):
             return "ممکنہ طور پر منفی ذرائع سے - اللہ کی پناہ مانگیں"
         else:
             return "روزمرہ کے خیالات اور تجربات کا عکس"
     
-    def _get_emotional_guidance(self, dream_text: str) -> str:
+    def _get_emotional_guidance(self, scan: DreamScan) -> str:
         """Get emotional guidance"""
-        if any(word in dream_text.lower() for word in ["happy", "peaceful", "joy"]):
+        if scan.has("guidance", "positive"):
             return "this may be a true dream carrying good news"
-        elif any(word in dream_text.lower() for word in ["fear", "scared", "terrified"]):
+        elif scan.has("guidance", "negative"):
             return "seeking refuge in Allah is recommended for any disturbing elements"
         else:
             return "reflect on how this dream relates to your current life situation"
 
+@st.cache_resource
+def get_shared_interpreter() -> AdvancedDreamInterpreter:
+    """The interpreter every session shares; it holds only read-only tables and process-wide caches"""
+    return AdvancedDreamInterpreter()
+
+class SessionDream:
+    """What a session keeps between reruns: its last dream, plus the interpretation only when it is not cached"""
+    __slots__ = ("dream_text", "language", "fingerprint", "interpretation")
+    
+    def __init__(self, dream_text: str, language: str, fingerprint: str, interpretation: Optional[Dict] = None):
+        self.dream_text = dream_text
+        self.language = language
+        self.fingerprint = fingerprint  # Names the rendered HTML
+        self.interpretation = interpretation
+    
+    def load(self, interpreter: AdvancedDreamInterpreter) -> Dict:
+        """The interpretation as kept, as cached, or interpreted again if it was evicted since"""
+        language = self.language.lower()
+        return (
+            self.interpretation
+            or interpreter.cached_interpretation(self.dream_text, language)
+            or interpreter.analyze_dream_with_ai(self.dream_text, language)
+        )
+
+def session_memory() -> List[Dict]:
+    """Bytes held by each session state entry, leaving out the shared lexicon"""
+    shared = (get_lexicon(),)
+    rows = [{"key": key, "bytes": deep_sizeof(value, shared)} for key, value in st.session_state.to_dict().items()]
+    return sorted(rows, key=lambda row: row["bytes"], reverse=True)
+
+@st.fragment(run_every=LIVE_PREVIEW_INTERVAL)
+def render_live_preview():
+    """Show the themes and tone of the dream being written, rescanning only the edited part"""
+    if "live_scan" not in st.session_state:
+        st.session_state.live_scan = LiveScan()
+    live = st.session_state.live_scan
+    live.update(st.session_state.get("dream_input", ""))
+    preview = live.preview()
+    st.caption(
+        f"Themes: {', '.join(preview['themes']) or '—'} · Tone: {preview['tone']} · Dream type: {preview['dream_type']}"
+    )
+
+def session_user_id() -> str:
+    """The ?user= query parameter, or an anonymous id kept for this browser session"""
+    if "user_id" not in st.session_state:
+        st.session_state.user_id = st.query_params.get("user") or f"anonymous-{uuid.uuid4().hex[:12]}"
+    return st.session_state.user_id
+
+def render_history_panel(store):
+    """Page through the user's past dreams, newest first"""
+    cursor = st.session_state.get("history_cursor")
+    page = store.user_dreams(session_user_id(), HISTORY_PAGE_SIZE, cursor)
+    if not page.entries:
+        st.caption("No dreams recorded yet.")
+    for entry in page.entries:
+        when = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["created_at"]))
+        st.markdown(f"**{when}** · {', '.join(entry['themes']) or 'general'} · {entry['tone']}")
+        st.caption(entry["dream_text"][:160])
+    newest, older = st.columns(2)
+    if cursor and newest.button("Newest", key="history_newest"):
+        st.session_state.history_cursor = None
+        st.rerun()
+    if page.cursor and older.button("Older", key="history_older"):
+        st.session_state.history_cursor = page.cursor
+        st.rerun()
+
+def render_similar_dreams(similar, dream_text: str):
+    """List the user's own past dreams closest to this one"""
+    normalized = normalize_dream_text(dream_text)
+    matches = similar.similar(dream_text, scan_dream(dream_text).themes, SIMILAR_DREAMS + 1, session_user_id(), SIMILAR_MIN_SCORE)
+    entries = similar.store.entries([match.dream_id for match in matches])
+    shown = [
+        (match, entries[match.dream_id]) for match in matches
+        if match.dream_id in entries and normalize_dream_text(entries[match.dream_id]["dream_text"]) != normalized
+    ][:SIMILAR_DREAMS]
+    if not shown:
+        st.caption("No similar dreams recorded yet.")
+    for match, entry in shown:
+        when = time.strftime("%Y-%m-%d", time.localtime(entry["created_at"]))
+        st.markdown(f"**{match.score:.0%} similar** · {when} · {', '.join(entry['themes']) or 'general'}")
+        st.caption(entry["dream_text"][:160])
+
 def main():
     # Configure Streamlit page
     st.set_page_config(
@@ -369,68 +616,13 @@ def main():
     )
     
     # Custom CSS
-    st.markdown("""
-    <style>
-    .main-header {
-        font-size: 2.8rem;
-        color: #1a5276;
-        text-align: center;
-        margin-bottom: 1rem;
-        font-weight: bold;
-        padding: 20px;
-        background: linear-gradient(135deg, #e8f4f8, #d1e7f5);
-        border-radius: 15px;
-    }
-    .urdu-text {
-        font-family: 'Jameel Noori Nastaleeq', 'Urdu Typesetting', 'Noto Nastaliq Urdu';
-        font-size: 1.2rem;
-        line-height: 2;
-        direction: rtl;
-        text-align: right;
-    }
-    .interpretation-section {
-        background: #f8f9fa;
-        padding: 25px;
-        border-radius: 15px;
-        margin: 20px 0;
-        border-left: 6px solid #1a5276;
-        box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-    }
-    .scholar-analysis {
-        background: white;
-        padding: 20px;
-        margin: 15px 0;
-        border-radius: 10px;
-        border-left: 4px solid #3498db;
-    }
-    .symbol-box {
-        background: #e8f6f3;
-        padding: 15px;
-        border-radius: 10px;
-        margin: 10px 0;
-        border: 2px solid #1abc9c;
-    }
-    .advice-box {
-        background: #fef9e7;
-        padding: 15px;
-        border-radius: 10px;
-        margin: 10px 0;
-        border: 2px solid #f39c12;
-    }
-    .language-tab {
-        font-size: 1.1rem;
-        font-weight: bold;
-    }
-    </style>
-    """, unsafe_allow_html=True)
+    st.html(STYLE)
     
     # Header
     st.markdown('<div class="main-header">🤖 AI Islamic Dream Interpreter</div>', unsafe_allow_html=True)
     st.markdown("### Complete Dream Analysis Using AI - Based on Ibn Sirin & Sheikh Nabulsi")
     
-    # Initialize interpreter
-    if 'interpreter' not in st.session_state:
-        st.session_state.interpreter = AdvancedDreamInterpreter()
+    interpreter = get_shared_interpreter()
     
     # Main input section
     st.markdown("## 🌙 Describe Your Complete Dream")
@@ -439,9 +631,15 @@ def main():
         "Write your full dream in detail:",
         height=200,
         placeholder="Describe your entire dream narrative. Include emotions, people, objects, colors, sequences, and how you felt when you woke up. Example: 'I dreamt I was walking through a beautiful garden with flowing rivers. The sun was shining and I felt extremely peaceful. Then I saw my deceased grandfather smiling at me...'",
-        help="The more detailed your description, the better the AI analysis will be."
+        help="The more detailed your description, the better the AI analysis will be.",
+        key="dream_input"
     )
     
+    if st.toggle("⚡ Live theme preview", help="Show detected themes and tone while you write"):
+        render_live_preview()
+    else:
+        st.session_state.pop("live_scan", None)
+    
     # Language selection
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
@@ -453,82 +651,63 @@ def main():
         )
     
     # Analyze button
+    streamed = False
     if st.button("🔮 Analyze Complete Dream with AI", type="primary", use_container_width=True):
         if not dream_text.strip():
             st.error("Please describe your dream first!")
         else:
+            st.markdown("---")
+            st.markdown("## 📊 Complete Dream Analysis")
+            placeholders = render_analysis_layout(language)
+            
+            # Fill each section as soon as it is produced
+            interpretation = {}
+            partial_text = {}
             with st.spinner("🤖 AI is analyzing your dream using Islamic scholarship..."):
-                time.sleep(2)  # Simulate processing time
-                
-                # Get interpretation
-                interpretation = st.session_state.interpreter.analyze_dream_with_ai(
-                    dream_text, 
-                    language.lower()
-                )
-                
-                st.session_state.current_interpretation = interpretation
-                st.session_state.dream_text = dream_text
-                st.session_state.language = language
+                if len(dream_text) > LONG_DREAM_CHARS:
+                    events = interpreter.analyze_journal_stream(dream_text, language.lower())
+                else:
+                    # The live preview has already scanned most of the text
+                    scan = st.session_state.live_scan.update(dream_text, force=True) if "live_scan" in st.session_state else None
+                    events = interpreter.analyze_dream_with_ai_stream(dream_text, language.lower(), scan, session_user_id())
+                for event in events:
+                    if event.kind == "segment":
+                        continue
+                    if event.kind == "token":
+                        partial_text[event.section] = partial_text.get(event.section, "") + event.data
+                        value = partial_text[event.section]
+                    else:
+                        interpretation[event.section] = value = event.data
+                    placeholders[event.section].markdown(section_html(event.section, value, language), unsafe_allow_html=True)
+            
+            # A cached interpretation is looked up again on rerun instead of being kept per session
+            cached = interpreter.cached_interpretation(dream_text, language.lower()) == interpretation
+            st.session_state.last_dream = SessionDream(
+                dream_text, language, interpretation_fingerprint(interpretation, language), None if cached else interpretation
+            )
+            streamed = True
+            
+            store = get_history_store()
+            if store is not None:
+                scan = scan_dream(dream_text)
+                store.record(dream_text, language.lower(), interpretation, scan.themes, tone_of(scan), session_user_id())
+                st.session_state.history_cursor = None
     
     # Display interpretation if available
-    if hasattr(st.session_state, 'current_interpretation'):
+    last_dream = st.session_state.get("last_dream")
+    if not streamed and last_dream is not None:
         st.markdown("---")
         st.markdown("## 📊 Complete Dream Analysis")
         
-        interpretation = st.session_state.current_interpretation
-        language = st.session_state.language
-        
-        # Dream Summary
-        st.markdown("### 📝 Dream Summary")
-        st.markdown(f'<div class="interpretation-section">{interpretation["summary"]}</div>', unsafe_allow_html=True)
-        
-        # Scholar Analyses
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.markdown("### 🧔 Ibn Sirin's Analysis")
-            if language == "Urdu":
-                st.markdown(f'<div class="urdu-text"><div class="scholar-analysis">{interpretation["ibn_sirin_analysis"]}</div></div>', unsafe_allow_html=True)
-            else:
-                st.markdown(f'<div class="scholar-analysis">{interpretation["ibn_sirin_analysis"]}</div>', unsafe_allow_html=True)
-        
-        with col2:
-            st.markdown("### 📚 Sheikh Nabulsi's Analysis")
-            if language == "Urdu":
-                st.markdown(f'<div class="urdu-text"><div class="scholar-analysis">{interpretation["nabulsi_analysis"]}</div></div>', unsafe_allow_html=True)
-            else:
-                st.markdown(f'<div class="scholar-analysis">{interpretation["nabulsi_analysis"]}</div>', unsafe_allow_html=True)
-        
-        # Symbolic Meanings
-        st.markdown("### 🔍 Symbolic Meanings")
-        if language == "Urdu":
-            symbols_html = "".join([f'<div class="symbol-box urdu-text">• {symbol}</div>' for symbol in interpretation["symbolic_meanings"]])
-        else:
-            symbols_html = "".join([f'<div class="symbol-box">• {symbol}</div>' for symbol in interpretation["symbolic_meanings"]])
-        st.markdown(symbols_html, unsafe_allow_html=True)
-        
-        # Practical Advice
-        st.markdown("### 💡 Practical Advice")
-        if language == "Urdu":
-            advice_html = "".join([f'<div class="advice-box urdu-text">• {advice}</div>' for advice in interpretation["practical_advice"]])
-        else:
-            advice_html = "".join([f'<div class="advice-box">• {advice}</div>' for advice in interpretation["practical_advice"]])
-        st.markdown(advice_html, unsafe_allow_html=True)
-        
-        # Spiritual Guidance
-        st.markdown("### 🌟 Spiritual Guidance")
-        if language == "Urdu":
-            guidance_html = "".join([f'<div class="symbol-box urdu-text">• {guidance}</div>' for guidance in interpretation["spiritual_guidance"]])
-        else:
-            guidance_html = "".join([f'<div class="symbol-box">• {guidance}</div>' for guidance in interpretation["spiritual_guidance"]])
-        st.markdown(guidance_html, unsafe_allow_html=True)
-        
-        # Overall Assessment
-        st.markdown("### 📈 Overall Assessment")
-        if language == "Urdu":
-            st.markdown(f'<div class="interpretation-section urdu-text">{interpretation["overall_assessment"]}</div>', unsafe_allow_html=True)
-        else:
-            st.markdown(f'<div class="interpretation-section">{interpretation["overall_assessment"]}</div>', unsafe_allow_html=True)
+        # Rendered once and emitted as one element; reruns only look the HTML up
+        results = rendered_interpretation(last_dream.fingerprint, last_dream.language, partial(last_dream.load, interpreter))
+        st.markdown(results, unsafe_allow_html=True)
+    
+    # Similar past dreams of this user, next to the interpretation
+    similar = get_similar_dreams()
+    if similar is not None and last_dream is not None:
+        with st.expander("🔗 Similar Past Dreams"):
+            render_similar_dreams(similar, last_dream.dream_text)
     
     # Sidebar
     with st.sidebar:
@@ -578,6 +757,26 @@ def main():
         4. Receive comprehensive interpretation
         5. Reflect on the guidance provided
         """)
+        
+        # Past dreams, only when DREAM_HISTORY_PATH is set
+        store = get_history_store()
+        if store is not None:
+            with st.expander("📜 My Past Dreams"):
+                render_history_panel(store)
+        
+        # Debug panel, only when DREAM_METRICS is enabled
+        if metrics.enabled:
+            with st.expander("🛠️ Pipeline Metrics"):
+                rows = [
+                    {"stage": stage, "calls": values["calls"], "mean ms": round(values["mean_s"] * 1000, 3), "max ms": round(values["max_s"] * 1000, 3)}
+                    for stage, values in metrics.snapshot().items()
+                ]
+                st.table(rows)
+                for name, values in metrics.collect().items():
+                    st.caption(f"{name}: " + ", ".join(f"{key}={value}" for key, value in values.items()))
+                usage = session_memory()
+                st.caption(f"Session memory: {sum(row['bytes'] for row in usage) / 1024:.1f} KB")
+                st.table(usage)
 
     # Footer
     st.markdown("---")
@@ -0,0 +1,215 @@
+import re
+import time
+from bisect import bisect_left
+from typing import Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from dream_lexicon import Lexicon, get_lexicon
+from dream_matcher import DreamScan
+
+# Sentence ends in English and Urdu (full stop, question marks), plus line breaks
+SEGMENT_END = re.compile(r"[.!?؟۔\n]+\s*")
+SEGMENT_MAX_CHARS = 1000
+
+
+class Segment(NamedTuple):
+    index: int
+    start: int
+    end: int
+    text: str
+    themes: Tuple[str, ...]
+    tone: str
+    dream_type: str
+
+
+def _label(tags: FrozenSet[Tuple[str, str]], category: str, first: str, second: str, default: str) -> str:
+    """Pick a cue label with the same precedence as the interpreter's tone and type checks"""
+    if (category, first) in tags:
+        return first
+    if (category, second) in tags:
+        return second
+    return default
+
+
+def tone_of(scan: DreamScan) -> str:
+    """Overall tone of a scan: positive, negative or neutral"""
+    return _label(scan.tags, "tone", "positive", "negative", "neutral")
+
+
+def dream_type_of(scan: DreamScan) -> str:
+    """Dream type of a scan: true, bad or reflective"""
+    return _label(scan.tags, "dream_type", "true", "bad", "reflective")
+
+
+def iter_segments(source: Union[str, Iterable[str]], max_chars: int = SEGMENT_MAX_CHARS) -> Iterator[Tuple[int, str]]:
+    """Split text, or an iterable of text chunks, into sentence segments with their start offsets"""
+    chunks = (source,) if isinstance(source, str) else source
+    pending, offset = "", 0
+    for chunk in chunks:
+        pending += chunk
+        position = 0
+        while True:
+            # A sentence end at the very end of the buffer may continue in the next chunk
+            match = SEGMENT_END.search(pending, position, position + max_chars)
+            if match and match.end() < len(pending):
+                end = match.end()
+            elif len(pending) - position > max_chars:
+                # Run-on text: cut at the last space so memory stays bounded
+                space = pending.rfind(" ", position, position + max_chars)
+                end = space + 1 if space > position else position + max_chars
+            else:
+                break
+            if not pending[position:end].isspace():
+                yield offset + position, pending[position:end]
+            position = end
+        pending = pending[position:]
+        offset += position
+    if pending and not pending.isspace():
+        yield offset, pending
+
+
+class JournalTimeline:
+    """Running per-theme and per-tone totals of a journal, plus the points where they shift"""
+
+    def __init__(self, lexicon: Optional[Lexicon] = None):
+        self.lexicon = lexicon or get_lexicon()
+        self.segments = 0
+        self.characters = 0
+        self.theme_counts: Dict[str, int] = {}
+        self.first_seen: Dict[str, int] = {}
+        self.tone_counts: Dict[str, int] = {}
+        self.shifts: List[Dict] = []
+        self._tags = set()
+
+    def add(self, start: int, text: str) -> Segment:
+        """Scan one segment and fold it into the totals"""
+        scan = self.lexicon.scan(text)
+        segment = Segment(
+            self.segments,
+            start,
+            start + len(text),
+            text,
+            scan.themes,
+            tone_of(scan),
+            dream_type_of(scan),
+        )
+        self.segments += 1
+        self.characters = segment.end
+        self._tags.update(scan.tags)
+        for theme in segment.themes:
+            self.theme_counts[theme] = self.theme_counts.get(theme, 0) + 1
+            self.first_seen.setdefault(theme, segment.index)
+        self.tone_counts[segment.tone] = self.tone_counts.get(segment.tone, 0) + 1
+
+        # Only segments that carry a signal, and change it, mark a shift
+        if segment.themes or segment.tone != "neutral":
+            last = self.shifts[-1] if self.shifts else None
+            if last is None or last["themes"] != list(segment.themes) or last["tone"] != segment.tone:
+                self.shifts.append({
+                    "segment": segment.index,
+                    "start": segment.start,
+                    "themes": list(segment.themes),
+                    "tone": segment.tone,
+                })
+        return segment
+
+    def scan(self) -> DreamScan:
+        """The merged scan of every segment, as if the whole journal had been scanned at once"""
+        themes = tuple(theme for theme in self.lexicon.themes if theme in self.theme_counts)
+        return DreamScan((), themes, frozenset(self._tags))
+
+    def summary(self) -> Dict:
+        """Totals and shift points, ready to attach to an interpretation"""
+        return {
+            "segments": self.segments,
+            "characters": self.characters,
+            "theme_counts": {theme: self.theme_counts[theme] for theme in self.lexicon.themes if theme in self.theme_counts},
+            "first_seen": {theme: self.first_seen[theme] for theme in self.lexicon.themes if theme in self.first_seen},
+            "tone_counts": dict(self.tone_counts),
+            "shifts": self.shifts,
+        }
+
+
+class LiveSegment(NamedTuple):
+    start: int
+    end: int
+    scan: DreamScan
+
+
+def _common_prefix(a: str, b: str) -> int:
+    """Length of the common prefix, found with slice comparisons instead of a per-character loop"""
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[low:middle] == b[low:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+class LiveScan:
+    """Scan of a dream being edited that rescans only the segments touched since the last update"""
+
+    def __init__(self, debounce: float = 0.3):
+        self.debounce = debounce
+        self.lexicon: Optional[Lexicon] = None
+        self.text = ""
+        self.segments: List[LiveSegment] = []
+        self.rescanned = 0  # Characters scanned by the last update
+        self._scan = DreamScan((), (), frozenset())
+        self._scanned_at = float("-inf")
+        self._pending = False
+        self._by_text: Dict[str, DreamScan] = {}
+
+    @property
+    def pending(self) -> bool:
+        """Whether an edit is waiting for the debounce interval to pass"""
+        return self._pending
+
+    def update(self, text: str, force: bool = False) -> DreamScan:
+        """Bring the scan up to date with text, unless the last update was less than debounce seconds ago"""
+        now = time.monotonic()
+        if text == self.text and self.lexicon is not None:
+            self._pending = False
+            return self._scan
+        if not force and now - self._scanned_at < self.debounce:
+            self._pending = True
+            return self._scan
+        self._pending = False
+        self._scanned_at = now
+
+        lexicon = get_lexicon()
+        if lexicon is not self.lexicon:
+            self.lexicon, self.segments, self._by_text = lexicon, [], {}
+
+        # Segments ending before the first edited character keep their position and scan; the
+        # character after them is unchanged too, so their sentence ends cannot move
+        edit = _common_prefix(self.text, text)
+        keep = bisect_left([segment.end for segment in self.segments], edit)
+        segments = self.segments[:keep]
+        resume = segments[-1].end if segments else 0
+        self.rescanned = 0
+        for start, chunk in iter_segments(text[resume:]):
+            # Segments after the edit usually reappear unchanged at a shifted offset
+            scan = self._by_text.get(chunk)
+            if scan is None:
+                scan = lexicon.scan(chunk)
+                self.rescanned += len(chunk)
+            segments.append(LiveSegment(resume + start, resume + start + len(chunk), scan))
+
+        self.text, self.segments = text, segments
+        self._by_text = {text[segment.start:segment.end]: segment.scan for segment in segments}
+        tags = frozenset().union(*(segment.scan.tags for segment in segments))
+        themes = tuple(theme for theme in lexicon.themes if ("theme", theme) in tags)
+        self._scan = DreamScan((), themes, tags)
+        return self._scan
+
+    def preview(self) -> Dict:
+        """Themes, tone and dream type of the current scan"""
+        return {
+            "themes": list(self._scan.themes),
+            "tone": tone_of(self._scan),
+            "dream_type": dream_type_of(self._scan),
+            "segments": len(self.segments),
+            "rescanned": self.rescanned,
+        }
@@ -0,0 +1,264 @@
+import array
+import glob
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from collections.abc import Sequence
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Optional
+
+from dream_matcher import DreamScan, RegexMatcher, SymbolMatcher, build_automaton, lexicon_keyword_tags
+
+logger = logging.getLogger(__name__)
+
+LEXICON_PATH = os.environ.get("DREAM_LEXICON_PATH") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "lexicon.json"
+)
+RELOAD_INTERVAL = float(os.environ.get("DREAM_LEXICON_RELOAD_INTERVAL", "5"))
+# Lexicons up to this many keywords scan with the regex matcher instead of the memory-mapped automaton:
+# several times faster, but every process decodes the keywords and compiles it on each reload, so the
+# snapshot is no longer the only copy. Off by default; sharing the snapshot is what keeps processes small
+REGEX_MAX_KEYWORDS = int(os.environ.get("DREAM_REGEX_MAX_KEYWORDS", "0"))
+
+SNAPSHOT_MAGIC = b"DRLX"
+SNAPSHOT_FORMAT = 1
+_HEADER = struct.Struct("<4sII")  # magic, format, length of the JSON metadata
+REQUIRED_KEYS = ("version", "themes", "cues", "symbols", "glosses")
+
+
+class LexiconError(Exception):
+    """Raised when a lexicon source or snapshot is invalid"""
+
+
+def read_lexicon_source(path: str = LEXICON_PATH) -> Dict:
+    """Read and validate a lexicon source file"""
+    with open(path, encoding="utf-8") as f:
+        source = json.load(f)
+    missing = [key for key in REQUIRED_KEYS if key not in source]
+    if missing:
+        raise LexiconError(f"{path} is missing {', '.join(missing)}")
+    return source
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def compile_snapshot(source: Dict, source_sha: str, target: str):
+    """Compile a lexicon source into a memory-mappable binary snapshot"""
+    arrays, keywords, tags = build_automaton(lexicon_keyword_tags(source))
+    encoded = [keyword.encode("utf-8") for keyword in keywords]
+    keyword_offsets = [0]
+    for word in encoded:
+        keyword_offsets.append(keyword_offsets[-1] + len(word))
+    arrays["keyword_offsets"] = keyword_offsets
+
+    # Automaton arrays are stored as native uint32 so they can be used straight from the mapping
+    blobs, layout, offset = [], {}, 0
+    for name, values in arrays.items():
+        data = array.array("I", values).tobytes()
+        layout[name] = [offset, len(values)]
+        blobs.append((offset, data))
+        offset = _align(offset + len(data))
+    keyword_text = b"".join(encoded)
+    blobs.append((offset, keyword_text))
+
+    meta = {
+        "format": SNAPSHOT_FORMAT,
+        "version": source["version"],
+        "source_sha": source_sha,
+        "byteorder": sys.byteorder,
+        "arrays": layout,
+        "keyword_text": [offset, len(keyword_text)],
+        "tags": tags,
+        "themes": list(source["themes"]),
+        "symbols": source["symbols"],
+        "glosses": source["glosses"],
+    }
+    meta_json = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+    data_start = _align(_HEADER.size + len(meta_json))
+
+    directory = os.path.dirname(target)
+    os.makedirs(directory, exist_ok=True)
+    fd, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, len(meta_json)))
+            f.write(meta_json)
+            for blob_offset, data in blobs:
+                f.seek(data_start + blob_offset)
+                f.write(data)
+        os.chmod(temporary, 0o644)
+        # Readers that already mapped the previous file keep using it undisturbed
+        os.replace(temporary, target)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def freeze(value):
+    """Read-only copy of nested JSON-like data: dicts become mapping proxies and lists tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class _StringTable(Sequence):
+    """Keywords decoded on demand from the mapped UTF-8 blob"""
+
+    def __init__(self, blob: memoryview, offsets: Sequence[int]):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __getitem__(self, index: int) -> str:
+        return bytes(self._blob[self._offsets[index]:self._offsets[index + 1]]).decode("utf-8")
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+
+class Lexicon:
+    """A memory-mapped lexicon snapshot: symbol matcher plus interpretation tables"""
+
+    def __init__(self, snapshot_path: str):
+        with open(snapshot_path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        magic, snapshot_format, meta_length = _HEADER.unpack_from(view)
+        if magic != SNAPSHOT_MAGIC or snapshot_format != SNAPSHOT_FORMAT:
+            raise LexiconError(f"{snapshot_path} is not a format {SNAPSHOT_FORMAT} lexicon snapshot")
+        meta = json.loads(bytes(view[_HEADER.size:_HEADER.size + meta_length]))
+        if meta["byteorder"] != sys.byteorder:
+            raise LexiconError(f"{snapshot_path} was compiled for a {meta['byteorder']}-endian machine")
+
+        data_start = _align(_HEADER.size + meta_length)
+        arrays = {
+            name: view[data_start + offset:data_start + offset + count * 4].cast("I")
+            for name, (offset, count) in meta["arrays"].items()
+        }
+        text_offset, text_length = meta["keyword_text"]
+        keywords = _StringTable(view[data_start + text_offset:data_start + text_offset + text_length], arrays.pop("keyword_offsets"))
+
+        self.path = snapshot_path
+        self.version = f"{meta['version']}+{meta['source_sha'][:12]}"
+        self.themes = tuple(meta["themes"])
+        matcher_class = RegexMatcher if len(keywords) <= REGEX_MAX_KEYWORDS else SymbolMatcher
+        self.matcher = matcher_class(arrays, keywords, meta["tags"], meta["themes"])
+        # Shared by every session, so read-only
+        self.theme_table = freeze(self._index_theme_texts(meta["glosses"], meta["symbols"]))
+
+    @staticmethod
+    def _index_theme_texts(glosses: Dict, symbols: Dict) -> Dict[str, Dict[str, Dict[str, str]]]:
+        """Invert the per-section tables into theme -> section -> language -> text"""
+        table: Dict[str, Dict[str, Dict[str, str]]] = {}
+        for section, languages in {**glosses, "symbolic_meanings": symbols}.items():
+            for language, texts in languages.items():
+                for theme, text in texts.items():
+                    table.setdefault(theme, {}).setdefault(section, {})[language] = text
+        return table
+
+    def scan(self, dream_text: str) -> DreamScan:
+        """Scan a dream with this lexicon's matcher"""
+        return self.matcher.scan(dream_text)
+
+
+def _snapshot_directory(path: str) -> str:
+    return os.environ.get("DREAM_LEXICON_CACHE") or os.path.join(os.path.dirname(os.path.abspath(path)), ".lexicon-cache")
+
+
+def load_lexicon(path: str = LEXICON_PATH) -> Lexicon:
+    """Map the snapshot of the lexicon source at path, compiling it first if needed"""
+    with open(path, "rb") as f:
+        source_sha = hashlib.sha256(f.read()).hexdigest()
+    directory = _snapshot_directory(path)
+    snapshot = os.path.join(directory, f"lexicon-{source_sha[:16]}.snapshot")
+    if os.path.exists(snapshot):
+        try:
+            return Lexicon(snapshot)
+        except (LexiconError, ValueError, KeyError, struct.error) as e:
+            logger.warning("Recompiling unusable lexicon snapshot %s: %s", snapshot, e)
+
+    compile_snapshot(read_lexicon_source(path), source_sha, snapshot)
+    for stale in glob.glob(os.path.join(directory, "lexicon-*.snapshot")):
+        if stale != snapshot:
+            try:
+                os.unlink(stale)
+            except OSError:
+                pass  # Still mapped elsewhere on platforms that forbid it
+    return Lexicon(snapshot)
+
+
+_lexicon: Optional[Lexicon] = None
+_lexicon_stamp = None
+_checked_at = 0.0
+_lexicon_lock = threading.Lock()
+
+
+def _refresh(force: bool = False):
+    global _lexicon, _lexicon_stamp
+    try:
+        stat = os.stat(LEXICON_PATH)
+    except OSError as e:
+        if _lexicon is None:
+            raise
+        # Warn once while the source is missing; it is loaded again when it comes back
+        if _lexicon_stamp is not None:
+            logger.warning("Keeping lexicon %s, cannot read %s: %s", _lexicon.version, LEXICON_PATH, e)
+        _lexicon_stamp = None
+        return
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    if not force and _lexicon is not None and stamp == _lexicon_stamp:
+        return
+    try:
+        lexicon = load_lexicon(LEXICON_PATH)
+    except (OSError, ValueError, KeyError, LexiconError) as e:
+        if _lexicon is None:
+            raise
+        logger.warning("Keeping lexicon %s, reloading %s failed: %s", _lexicon.version, LEXICON_PATH, e)
+        _lexicon_stamp = stamp
+        return
+    _lexicon, _lexicon_stamp = lexicon, stamp
+    scan_dream.cache_clear()
+
+
+def get_lexicon() -> Lexicon:
+    """Return the current lexicon, hot-reloading it when its source file changes"""
+    global _checked_at
+    if _lexicon is not None and time.monotonic() - _checked_at < RELOAD_INTERVAL:
+        return _lexicon
+    with _lexicon_lock:
+        if _lexicon is None or time.monotonic() - _checked_at >= RELOAD_INTERVAL:
+            _refresh()
+            _checked_at = time.monotonic()
+    return _lexicon
+
+
+def reload_lexicon() -> Lexicon:
+    """Reload the lexicon now, whether or not its source file changed"""
+    global _checked_at
+    with _lexicon_lock:
+        _refresh(force=True)
+        _checked_at = time.monotonic()
+    return _lexicon
+
+
+@lru_cache(maxsize=64)
+def scan_dream(dream_text: str) -> DreamScan:
+    """Scan a dream once and share the result between the section builders"""
+    return get_lexicon().scan(dream_text)
+
+
+if __name__ == "__main__":
+    lexicon = load_lexicon(sys.argv[1] if len(sys.argv) > 1 else LEXICON_PATH)
+    print(f"lexicon {lexicon.version}: {len(lexicon.matcher.keywords)} keywords, "
+          f"{len(lexicon.matcher.arrays['fail'])} states -> {lexicon.path} ({os.path.getsize(lexicon.path)} bytes)")
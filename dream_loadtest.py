@@ -0,0 +1,102 @@
+import argparse
+import json
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+import requests
+
+from dream_workload import percentile, synthetic_dream
+
+
+def _worker(url: str, bodies: List[bytes], deadline: float, results: List, lock: threading.Lock):
+    """Send requests over one keep-alive connection until the deadline"""
+    session = requests.Session()
+    latencies, statuses, index = [], {}, 0
+    while time.perf_counter() < deadline:
+        body = bodies[index % len(bodies)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            response = session.post(url, data=body, headers={"Content-Type": "application/json"}, timeout=30)
+            status = str(response.status_code)
+        except requests.RequestException as e:
+            status = type(e).__name__
+        latencies.append(time.perf_counter() - started)
+        statuses[status] = statuses.get(status, 0) + 1
+    with lock:
+        results.append((latencies, statuses))
+
+
+def run(url: str, concurrency: int, duration: float, size: int, density: float, language: str, batch: int = 0) -> Dict:
+    """Load the service with concurrent clients for duration seconds"""
+    dreams = [synthetic_dream(size, density, language, seed) for seed in range(64)]
+    if batch:
+        endpoint = url.rstrip("/") + "/interpret/batch"
+        bodies = [
+            json.dumps({"dreams": dreams[i:i + batch], "language": language}).encode("utf-8")
+            for i in range(0, len(dreams), batch)
+        ]
+    else:
+        endpoint = url.rstrip("/") + "/interpret"
+        bodies = [json.dumps({"text": dream, "language": language}).encode("utf-8") for dream in dreams]
+
+    results, lock = [], threading.Lock()
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=_worker, args=(endpoint, bodies, started + duration, results, lock))
+        for _ in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for worker_latencies, _ in results for latency in worker_latencies]
+    statuses: Dict[str, int] = {}
+    for _, worker_statuses in results:
+        for status, count in worker_statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "duration_s": elapsed,
+        "requests": len(latencies),
+        "dreams_per_request": batch or 1,
+        "throughput_per_s": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000 if latencies else None,
+        "p95_ms": percentile(latencies, 95) * 1000 if latencies else None,
+        "p99_ms": percentile(latencies, 99) * 1000 if latencies else None,
+        "statuses": statuses,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test a running dream interpretation service")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("-c", "--concurrency", type=int, default=16, help="concurrent keep-alive clients")
+    parser.add_argument("-d", "--duration", type=float, default=10.0, help="seconds to run")
+    parser.add_argument("--size", type=int, default=1000, help="dream length in characters")
+    parser.add_argument("--density", type=float, default=0.05, help="keyword density of the synthetic dreams")
+    parser.add_argument("-l", "--language", default="english", choices=["english", "urdu"])
+    parser.add_argument("--batch", type=int, default=0, help="dreams per /interpret/batch request (0: use /interpret)")
+    parser.add_argument("-o", "--output", default=None, help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = run(args.url, args.concurrency, args.duration, args.size, args.density, args.language, args.batch)
+    print(
+        f"{report['requests']} requests in {report['duration_s']:.1f}s  {report['throughput_per_s']:.1f}/s  "
+        f"p50 {report['p50_ms'] or 0:.1f} ms  p95 {report['p95_ms'] or 0:.1f} ms  p99 {report['p99_ms'] or 0:.1f} ms  "
+        f"statuses {report['statuses']}",
+        file=sys.stderr,
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0 if report["requests"] and set(report["statuses"]) <= {"200"} else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
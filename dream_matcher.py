@@ -0,0 +1,265 @@
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import deque
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Sequence, Tuple
+
+from dream_metrics import timed
+
+# Flat automaton arrays, as stored in a lexicon snapshot
+AUTOMATON_ARRAYS = (
+    "state_offsets",   # per state: start of its transitions (plus one final end)
+    "trans_chars",     # transition code points, sorted within each state
+    "trans_next",      # transition targets
+    "fail",            # per state: failure link
+    "out_link",        # per state: nearest failure ancestor with keywords of its own, or 0
+    "out_offsets",     # per state: start of its own keywords (plus one final end)
+    "out_keywords",    # keyword ids
+    "keyword_lengths", # per keyword: length in characters
+    "tag_offsets",     # per keyword: start of its tags (plus one final end)
+    "tag_ids",         # indexes into the tag list
+)
+
+
+class SymbolMatch(NamedTuple):
+    start: int
+    end: int
+    keyword: str
+    category: str
+    label: str
+
+
+class DreamScan(NamedTuple):
+    matches: Tuple[SymbolMatch, ...]
+    themes: Tuple[str, ...]
+    tags: FrozenSet[Tuple[str, str]]
+
+    def has(self, category: str, label: str) -> bool:
+        """Check whether any keyword of category/label was found"""
+        return (category, label) in self.tags
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_" or unicodedata.category(char).startswith("M")
+
+
+def _trie_pattern(keywords: Sequence[str]) -> str:
+    """A regex alternation nested like a trie, so each start is tried once per character rather than once per keyword"""
+    trie: Dict = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def pattern(node: Dict) -> str:
+        # Longer continuations come before the keyword ending here, so the longest keyword wins
+        branches = [re.escape(char) + pattern(child) for char, child in sorted(node.items()) if char]
+        if "" in node:
+            branches.append("")
+        if len(branches) == 1:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")"
+
+    return pattern(trie)
+
+
+def lexicon_keyword_tags(lexicon: Dict) -> Dict[str, List[Tuple[str, str]]]:
+    """Collect the (category, label) tags of every keyword in a lexicon source"""
+    categories = {"theme": lexicon["themes"], **lexicon["cues"]}
+    tags_by_keyword: Dict[str, List[Tuple[str, str]]] = {}
+    for category, labels in categories.items():
+        for label, languages in labels.items():
+            for keywords in languages.values():
+                for keyword in keywords:
+                    tags = tags_by_keyword.setdefault(keyword.lower(), [])
+                    if (category, label) not in tags:
+                        tags.append((category, label))
+    return tags_by_keyword
+
+
+def build_automaton(tags_by_keyword: Dict[str, List[Tuple[str, str]]]) -> Tuple[Dict[str, List[int]], List[str], List[Tuple[str, str]]]:
+    """Compile keywords into flat Aho-Corasick arrays, the keyword list and the tag list"""
+    goto: List[Dict[str, int]] = [{}]
+    own: List[List[int]] = [[]]
+    keywords = list(tags_by_keyword)
+    for keyword_id, keyword in enumerate(keywords):
+        state = 0
+        for char in keyword:
+            next_state = goto[state].get(char)
+            if next_state is None:
+                next_state = goto[state][char] = len(goto)
+                goto.append({})
+                own.append([])
+            state = next_state
+        own[state].append(keyword_id)
+
+    fail = [0] * len(goto)
+    out_link = [0] * len(goto)
+    queue = deque(goto[0].values())
+    while queue:
+        state = queue.popleft()
+        for char, next_state in goto[state].items():
+            queue.append(next_state)
+            fallback = fail[state]
+            while fallback and char not in goto[fallback]:
+                fallback = fail[fallback]
+            target = goto[fallback].get(char, 0)
+            fail[next_state] = target if target != next_state else 0
+            out_link[next_state] = fail[next_state] if own[fail[next_state]] else out_link[fail[next_state]]
+
+    tags: List[Tuple[str, str]] = []
+    tag_index: Dict[Tuple[str, str], int] = {}
+    arrays: Dict[str, List[int]] = {name: [] for name in AUTOMATON_ARRAYS}
+    for state, transitions in enumerate(goto):
+        arrays["state_offsets"].append(len(arrays["trans_chars"]))
+        for char in sorted(transitions, key=ord):
+            arrays["trans_chars"].append(ord(char))
+            arrays["trans_next"].append(transitions[char])
+        arrays["out_offsets"].append(len(arrays["out_keywords"]))
+        arrays["out_keywords"].extend(own[state])
+    arrays["state_offsets"].append(len(arrays["trans_chars"]))
+    arrays["out_offsets"].append(len(arrays["out_keywords"]))
+    arrays["fail"] = fail
+    arrays["out_link"] = out_link
+    for keyword in keywords:
+        arrays["keyword_lengths"].append(len(keyword))
+        arrays["tag_offsets"].append(len(arrays["tag_ids"]))
+        for tag in tags_by_keyword[keyword]:
+            if tag not in tag_index:
+                tag_index[tag] = len(tags)
+                tags.append(tag)
+            arrays["tag_ids"].append(tag_index[tag])
+    arrays["tag_offsets"].append(len(arrays["tag_ids"]))
+    return arrays, keywords, tags
+
+
+class SymbolMatcher:
+    """Aho-Corasick matcher over flat automaton arrays (lists or memory-mapped views)"""
+
+    def __init__(
+        self,
+        arrays: Dict[str, Sequence[int]],
+        keywords: Sequence[str],
+        tags: Sequence[Tuple[str, str]],
+        theme_order: Sequence[str],
+        suffixes: Tuple[str, ...] = ("s",),
+    ):
+        self.arrays = arrays
+        self.keywords = keywords
+        self.tags = [tuple(tag) for tag in tags]
+        self.theme_order = list(theme_order)
+        self.suffixes = suffixes
+        # Most characters are looked up from the root, so keep its transitions in a dict
+        start, end = arrays["state_offsets"][0], arrays["state_offsets"][1]
+        self._root = {arrays["trans_chars"][i]: arrays["trans_next"][i] for i in range(start, end)}
+
+    @classmethod
+    def from_lexicon(cls, lexicon: Dict) -> "SymbolMatcher":
+        """Compile a matcher in memory straight from a lexicon source"""
+        arrays, keywords, tags = build_automaton(lexicon_keyword_tags(lexicon))
+        return cls(arrays, keywords, tags, list(lexicon["themes"]))
+
+    def _word_end(self, text: str, end: int) -> Optional[int]:
+        """Return the end of the word if a keyword ending at end is whole, else None"""
+        # Diacritics written on the keyword's last letter belong to it
+        while end < len(text) and unicodedata.category(text[end]).startswith("M"):
+            end += 1
+        if end == len(text) or not _is_word_char(text[end]):
+            return end
+        for suffix in self.suffixes:
+            stop = end + len(suffix)
+            if text.startswith(suffix, end) and (stop == len(text) or not _is_word_char(text[stop])):
+                return stop
+        return None
+
+    def find(self, text: str) -> List[SymbolMatch]:
+        """Find every whole-word keyword occurrence in a single pass over the text"""
+        lowered = text.lower()
+        # Offsets refer to the original text even if lowercasing changed its length
+        index = None if len(lowered) == len(text) else [i for i, char in enumerate(text) for _ in char.lower()]
+
+        arrays, root = self.arrays, self._root
+        offsets, chars, targets, fail = arrays["state_offsets"], arrays["trans_chars"], arrays["trans_next"], arrays["fail"]
+        out_offsets, out_keywords, out_link = arrays["out_offsets"], arrays["out_keywords"], arrays["out_link"]
+        lengths, tag_offsets, tag_ids = arrays["keyword_lengths"], arrays["tag_offsets"], arrays["tag_ids"]
+        matches = []
+        state = 0
+        for position, char in enumerate(lowered):
+            code = ord(char)
+            while state:
+                start, end = offsets[state], offsets[state + 1]
+                i = bisect_left(chars, code, start, end)
+                if i < end and chars[i] == code:
+                    state = targets[i]
+                    break
+                state = fail[state]
+            else:
+                state = root.get(code, 0)
+            hit = state if out_offsets[state] != out_offsets[state + 1] else out_link[state]
+            while hit:
+                for keyword_id in out_keywords[out_offsets[hit]:out_offsets[hit + 1]]:
+                    start = position + 1 - lengths[keyword_id]
+                    if start > 0 and _is_word_char(lowered[start - 1]):
+                        continue
+                    end = self._word_end(lowered, position + 1)
+                    if end is None:
+                        continue
+                    match_start, match_end = (start, end) if index is None else (index[start], index[end - 1] + 1)
+                    for tag_id in tag_ids[tag_offsets[keyword_id]:tag_offsets[keyword_id + 1]]:
+                        category, label = self.tags[tag_id]
+                        matches.append(SymbolMatch(match_start, match_end, self.keywords[keyword_id], category, label))
+                hit = out_link[hit]
+        return matches
+
+    @timed("symbol_scan")
+    def scan(self, text: str) -> DreamScan:
+        """Collect themes and tone/dream-type cues found in the text"""
+        matches = self.find(text)
+        tags = frozenset((match.category, match.label) for match in matches)
+        themes = tuple(theme for theme in self.theme_order if ("theme", theme) in tags)
+        return DreamScan(tuple(matches), themes, tags)
+
+
+class RegexMatcher(SymbolMatcher):
+    """Matcher backed by one compiled regex, which beats the pure-Python automaton until the lexicon gets large"""
+
+    def __init__(
+        self,
+        arrays: Dict[str, Sequence[int]],
+        keywords: Sequence[str],
+        tags: Sequence[Tuple[str, str]],
+        theme_order: Sequence[str],
+        suffixes: Tuple[str, ...] = ("s",),
+    ):
+        super().__init__(arrays, keywords, tags, theme_order, suffixes)
+        self._ids = {keyword: keyword_id for keyword_id, keyword in enumerate(keywords)}
+        # The regex finds the longest keyword at each word start; shorter keywords it extends start there too
+        self._pattern = re.compile(r"(?<!\w)(?=(" + _trie_pattern(list(self._ids)) + "))")
+        self._prefixes = {
+            keyword: [self._ids[keyword[:i]] for i in range(len(keyword) - 1, 0, -1) if keyword[:i] in self._ids]
+            for keyword in self._ids
+        }
+
+    def find(self, text: str) -> List[SymbolMatch]:
+        """Find every whole-word keyword occurrence with one regex pass over the text"""
+        lowered = text.lower()
+        index = None if len(lowered) == len(text) else [i for i, char in enumerate(text) for _ in char.lower()]
+
+        lengths, tag_offsets, tag_ids = self.arrays["keyword_lengths"], self.arrays["tag_offsets"], self.arrays["tag_ids"]
+        matches = []
+        for found in self._pattern.finditer(lowered):
+            start = found.start()
+            # \w leaves out combining marks, which still continue a word here
+            if start > 0 and _is_word_char(lowered[start - 1]):
+                continue
+            longest = found.group(1)
+            for keyword_id in (self._ids[longest], *self._prefixes[longest]):
+                end = self._word_end(lowered, start + lengths[keyword_id])
+                if end is None:
+                    continue
+                match_start, match_end = (start, end) if index is None else (index[start], index[end - 1] + 1)
+                for tag_id in tag_ids[tag_offsets[keyword_id]:tag_offsets[keyword_id + 1]]:
+                    category, label = self.tags[tag_id]
+                    matches.append(SymbolMatch(match_start, match_end, self.keywords[keyword_id], category, label))
+        return matches
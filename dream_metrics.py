@@ -0,0 +1,145 @@
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from types import BuiltinFunctionType, FunctionType, MethodType, ModuleType
+from typing import Callable, Dict, Iterable, List
+
+
+class MetricsRegistry:
+    """In-process registry of per-stage wall time and call counts"""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._stages: Dict[str, List[float]] = {}  # stage -> [calls, total seconds, max seconds]
+        self._collectors: Dict[str, Callable[[], Dict[str, float]]] = {}
+        self._lock = threading.Lock()
+
+    def enable(self, enabled: bool = True):
+        """Turn recording on or off at runtime"""
+        self.enabled = enabled
+
+    def record(self, stage: str, seconds: float):
+        """Add one timed call of a stage"""
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                self._stages[stage] = [1, seconds, seconds]
+            else:
+                entry[0] += 1
+                entry[1] += seconds
+                if seconds > entry[2]:
+                    entry[2] = seconds
+
+    def register_collector(self, name: str, collect: Callable[[], Dict[str, float]]):
+        """Expose the counters returned by collect (e.g. cache stats) alongside the stages"""
+        with self._lock:
+            self._collectors[name] = collect
+
+    def reset(self):
+        """Forget every recorded stage"""
+        with self._lock:
+            self._stages.clear()
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Return calls, total, mean and max seconds per stage"""
+        with self._lock:
+            stages = {stage: list(entry) for stage, entry in self._stages.items()}
+        return {
+            stage: {"calls": calls, "total_s": total, "mean_s": total / calls, "max_s": longest}
+            for stage, (calls, total, longest) in sorted(stages.items())
+        }
+
+    def collect(self) -> Dict[str, Dict[str, float]]:
+        """Return the values of every registered collector"""
+        with self._lock:
+            collectors = dict(self._collectors)
+        return {name: collect() for name, collect in collectors.items()}
+
+    def to_prometheus(self) -> str:
+        """Render stages and collector values in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP dream_stage_calls_total Calls per interpreter pipeline stage",
+            "# TYPE dream_stage_calls_total counter",
+        ]
+        lines += [f'dream_stage_calls_total{{stage="{stage}"}} {values["calls"]}' for stage, values in snapshot.items()]
+        lines += [
+            "# HELP dream_stage_seconds_total Wall time spent per interpreter pipeline stage",
+            "# TYPE dream_stage_seconds_total counter",
+        ]
+        lines += [f'dream_stage_seconds_total{{stage="{stage}"}} {values["total_s"]:.9f}' for stage, values in snapshot.items()]
+        lines += [
+            "# HELP dream_stage_seconds_max Slowest single call per interpreter pipeline stage",
+            "# TYPE dream_stage_seconds_max gauge",
+        ]
+        lines += [f'dream_stage_seconds_max{{stage="{stage}"}} {values["max_s"]:.9f}' for stage, values in snapshot.items()]
+        for name, values in sorted(self.collect().items()):
+            for key, value in sorted(values.items()):
+                metric = f"dream_{name}_{key}"
+                lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry(enabled=os.environ.get("DREAM_METRICS", "").lower() in ("1", "true", "yes"))
+
+
+@contextmanager
+def _timed_block(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.record(stage, time.perf_counter() - started)
+
+
+def stage(name: str):
+    """Context manager timing a block as a stage; a shared no-op while metrics are disabled"""
+    return _timed_block(name) if metrics.enabled else nullcontext()
+
+
+def timed(name=None):
+    """Decorator recording each call of a function as a stage (named after it by default)"""
+    def decorate(fn):
+        stage_name = name or fn.__name__.lstrip("_")
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return fn(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                metrics.record(stage_name, time.perf_counter() - started)
+        return wrapper
+
+    if callable(name):
+        fn, name = name, None
+        return decorate(fn)
+    return decorate
+
+
+def deep_sizeof(value, shared: Iterable = ()) -> int:
+    """Bytes held by value and everything it references, except the shared objects and code"""
+    seen = {id(item) for item in shared}
+    stack, total = [value], 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, (type, ModuleType, FunctionType, BuiltinFunctionType, MethodType)):
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        else:
+            stack.extend(vars(item).values() if hasattr(item, "__dict__") else ())
+            for slot in getattr(type(item), "__slots__", ()):
+                if hasattr(item, slot):
+                    stack.append(getattr(item, slot))
+    return total
@@ -0,0 +1,151 @@
+import logging
+import math
+import threading
+from functools import lru_cache
+from typing import Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+from dream_journal import iter_segments
+from dream_lexicon import get_lexicon
+from dream_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+OMISSION = " […] "
+
+
+class Prompt(NamedTuple):
+    system: str
+    user: str
+    tokens: int  # Local estimate for system and user together
+    truncated: bool  # Whether the dream was shortened to fit the budget
+
+
+class TokenUsage(NamedTuple):
+    prompt: int
+    completion: int
+    cached: int  # Prompt tokens the provider served from its prompt cache
+    estimated: bool  # Counted locally because the provider did not report usage
+
+
+def estimate_tokens(text: str) -> int:
+    """Token count without a tokenizer: about four Latin characters, or two of other scripts, per token"""
+    latin = len(text.encode("ascii", "ignore"))
+    return math.ceil(latin / 4 + (len(text) - latin) / 2)
+
+
+_system_prompts: Dict[int, Tuple[Mapping, str]] = {}
+_system_lock = threading.Lock()
+
+
+def system_prompt(guidelines: Mapping) -> str:
+    """The guideline prompt, built once per guidelines object so every request sends identical bytes"""
+    with _system_lock:
+        cached = _system_prompts.get(id(guidelines))
+        if cached is not None and cached[0] is guidelines:
+            return cached[1]
+    methodology = guidelines["scholars_methodology"]
+    text = "\n".join([
+        "You are an Islamic dream interpreter following classical scholarship.",
+        "Types of dreams:",
+        *[f"- {item}" for item in guidelines["types_of_dreams"]],
+        "Interpretation rules:",
+        *[f"- {rule}" for rule in guidelines["interpretation_rules"]],
+        f"Ibn Sirin: {methodology['ibn_sirin']}",
+        f"Nabulsi: {methodology['nabulsi']}",
+        "Answer in the format the request asks for.",
+    ])
+    with _system_lock:
+        if len(_system_prompts) >= 16:
+            _system_prompts.clear()
+        _system_prompts[id(guidelines)] = (guidelines, text)
+    return text
+
+
+def fit_dream(dream_text: str, max_tokens: int) -> Tuple[str, bool]:
+    """Shorten a dream to about max_tokens, keeping its opening, its ending and the sentences with themes or tone"""
+    if estimate_tokens(dream_text) <= max_tokens:
+        return dream_text, False
+    segments = [text for _, text in iter_segments(dream_text)]
+    lexicon = get_lexicon()
+    signal = [len(lexicon.scan(text).tags) for text in segments]
+    last = len(segments) - 1
+    order = sorted(range(len(segments)), key=lambda i: (i not in (0, last), -signal[i], i))
+
+    chosen, used = set(), 0
+    for i in order:
+        cost = estimate_tokens(segments[i]) + 2
+        if used + cost <= max_tokens:
+            chosen.add(i)
+            used += cost
+    if not chosen:
+        # Not even one sentence fits: cut the opening one
+        return dream_text[:max(0, max_tokens) * 2].rstrip() + OMISSION.rstrip(), True
+
+    parts: List[str] = []
+    for i, text in enumerate(segments):
+        if i in chosen:
+            parts.append(text)
+        elif not parts or parts[-1] != OMISSION:
+            parts.append(OMISSION)
+    return "".join(parts).strip(), True
+
+
+def build_prompt(
+    dream_text: str,
+    language: str,
+    guidelines: Mapping,
+    streaming: bool,
+    sections: Tuple[str, ...],
+    list_sections: Tuple[str, ...],
+    budget: Optional[int] = None,
+) -> Prompt:
+    """Static system prompt first, then the per-request format instructions and the dream, within budget tokens"""
+    system = system_prompt(guidelines)
+    listed = [section for section in sections if section in list_sections]
+    if streaming:
+        instructions = [
+            "Reply with these sections in order, each introduced by a line '## <name>': " + ", ".join(sections) + ".",
+            "In " + ", ".join(listed) + " write one item per line starting with '- '." if listed else "",
+        ]
+    else:
+        instructions = [
+            "Reply with a JSON object with the keys: " + ", ".join(sections) + ".",
+            "The keys " + ", ".join(listed) + " hold lists of strings, the others hold strings." if listed else "All keys hold strings.",
+        ]
+    head = "\n".join(instructions) + f"\n\nInterpret this dream in {language.title()}:\n\n"
+    overhead = estimate_tokens(system) + estimate_tokens(head)
+    truncated = False
+    if budget is not None:
+        dream_text, truncated = fit_dream(dream_text, budget - overhead)
+    return Prompt(system, head + dream_text, overhead + estimate_tokens(dream_text), truncated)
+
+
+_usage = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_prompt_tokens": 0, "estimated": 0, "truncated": 0}
+_usage_lock = threading.Lock()
+
+
+def token_stats() -> Dict[str, int]:
+    """Token totals of every backend request in this process"""
+    with _usage_lock:
+        return dict(_usage)
+
+
+@lru_cache(maxsize=None)
+def _register_collector():
+    metrics.register_collector("tokens", token_stats)
+
+
+def record_usage(provider: str, model: str, usage: TokenUsage, truncated: bool = False):
+    """Add one request's token counts to the totals"""
+    _register_collector()
+    with _usage_lock:
+        _usage["requests"] += 1
+        _usage["prompt_tokens"] += usage.prompt
+        _usage["completion_tokens"] += usage.completion
+        _usage["cached_prompt_tokens"] += usage.cached
+        _usage["estimated"] += usage.estimated
+        _usage["truncated"] += truncated
+    logger.debug(
+        "%s %s: %d prompt tokens (%d cached), %d completion tokens%s",
+        provider, model, usage.prompt, usage.cached, usage.completion, " (estimated)" if usage.estimated else "",
+    )
@@ -0,0 +1,170 @@
+import hashlib
+import html
+import json
+import re
+from typing import Callable, Dict, List, Optional
+
+import streamlit as st
+
+from dream_backends import LIST_SECTIONS
+
+# Written readable, sent minified: it is part of every rerun
+STYLE = "<style>" + re.sub(r"\s*([{};:,])\s*", r"\1", " ".join("""
+.main-header {
+    font-size: 2.8rem;
+    color: #1a5276;
+    text-align: center;
+    margin-bottom: 1rem;
+    font-weight: bold;
+    padding: 20px;
+    background: linear-gradient(135deg, #e8f4f8, #d1e7f5);
+    border-radius: 15px;
+}
+.urdu-text {
+    font-family: 'Jameel Noori Nastaleeq', 'Urdu Typesetting', 'Noto Nastaliq Urdu';
+    font-size: 1.2rem;
+    line-height: 2;
+    direction: rtl;
+    text-align: right;
+}
+.interpretation-section {
+    background: #f8f9fa;
+    padding: 25px;
+    border-radius: 15px;
+    margin: 20px 0;
+    border-left: 6px solid #1a5276;
+    box-shadow: 0 4px 6px rgba(0,0,0,0.1);
+}
+.scholar-analysis {
+    background: white;
+    padding: 20px;
+    margin: 15px 0;
+    border-radius: 10px;
+    border-left: 4px solid #3498db;
+}
+.symbol-box {
+    background: #e8f6f3;
+    padding: 15px;
+    border-radius: 10px;
+    margin: 10px 0;
+    border: 2px solid #1abc9c;
+}
+.advice-box {
+    background: #fef9e7;
+    padding: 15px;
+    border-radius: 10px;
+    margin: 10px 0;
+    border: 2px solid #f39c12;
+}
+.language-tab {
+    font-size: 1.1rem;
+    font-weight: bold;
+}
+.scholar-columns {
+    display: grid;
+    grid-template-columns: 1fr 1fr;
+    gap: 1rem;
+}
+""".split())) + "</style>"
+
+SECTION_HEADINGS = {
+    "summary": "📝 Dream Summary",
+    "ibn_sirin_analysis": "🧔 Ibn Sirin's Analysis",
+    "nabulsi_analysis": "📚 Sheikh Nabulsi's Analysis",
+    "symbolic_meanings": "🔍 Symbolic Meanings",
+    "practical_advice": "💡 Practical Advice",
+    "spiritual_guidance": "🌟 Spiritual Guidance",
+    "overall_assessment": "📈 Overall Assessment",
+}
+SCHOLAR_SECTIONS = ("ibn_sirin_analysis", "nabulsi_analysis")
+
+
+def _text(value) -> str:
+    """Escape model or user text for HTML, keeping its line breaks"""
+    return html.escape(str(value), quote=False).replace("\n", "<br>")
+
+
+def render_analysis_layout(language: str) -> Dict:
+    """Lay out the section headings and return an empty placeholder per section"""
+    placeholders = {}
+    for section, heading in SECTION_HEADINGS.items():
+        if section == "nabulsi_analysis":
+            continue
+        if section == "ibn_sirin_analysis":
+            # The two scholars side by side
+            for column, scholar in zip(st.columns(2), SCHOLAR_SECTIONS):
+                with column:
+                    st.markdown(f"### {SECTION_HEADINGS[scholar]}")
+                    placeholders[scholar] = st.empty()
+            continue
+        st.markdown(f"### {heading}")
+        placeholders[section] = st.empty()
+    
+    # Theme timeline (long journals only)
+    placeholders["timeline"] = st.empty()
+    
+    return placeholders
+
+
+def section_html(section: str, value, language: str) -> str:
+    """Render one interpretation section; partial streamed text is accepted too"""
+    urdu = language == "Urdu"
+    
+    if section in LIST_SECTIONS:
+        if isinstance(value, str):
+            value = [line.strip().lstrip("-•*").strip() for line in value.splitlines() if line.strip()]
+        box = "advice-box" if section == "practical_advice" else "symbol-box"
+        if urdu:
+            box += " urdu-text"
+        return "".join(f'<div class="{box}">• {_text(item)}</div>' for item in value)
+    
+    if section in SCHOLAR_SECTIONS:
+        if urdu:
+            return f'<div class="urdu-text"><div class="scholar-analysis">{_text(value)}</div></div>'
+        return f'<div class="scholar-analysis">{_text(value)}</div>'
+    
+    if section == "timeline":
+        counts = ", ".join(f"{_text(theme)} ×{count}" for theme, count in value["theme_counts"].items())
+        shifts = "".join(
+            f'<div class="symbol-box">Segment {shift["segment"] + 1}: {_text(", ".join(shift["themes"]) or "—")} ({_text(shift["tone"])})</div>'
+            for shift in value["shifts"]
+        )
+        return f'<div class="interpretation-section">{value["segments"]} segments · {counts}</div>{shifts}'
+    
+    if section == "overall_assessment" and urdu:
+        return f'<div class="interpretation-section urdu-text">{_text(value)}</div>'
+    return f'<div class="interpretation-section">{_text(value)}</div>'
+
+
+def interpretation_html(interpretation: Dict, language: str) -> str:
+    """The whole results page as one HTML fragment, in the layout of render_analysis_layout"""
+    parts: List[str] = []
+    for section, heading in SECTION_HEADINGS.items():
+        if section == "nabulsi_analysis":
+            continue
+        if section == "ibn_sirin_analysis":
+            columns = "".join(
+                f"<div><h3>{SECTION_HEADINGS[scholar]}</h3>{section_html(scholar, interpretation.get(scholar, ''), language)}</div>"
+                for scholar in SCHOLAR_SECTIONS
+            )
+            parts.append(f'<div class="scholar-columns">{columns}</div>')
+            continue
+        parts.append(f"<h3>{heading}</h3>")
+        if section in interpretation:
+            parts.append(section_html(section, interpretation[section], language))
+    if "timeline" in interpretation:
+        parts.append(section_html("timeline", interpretation["timeline"], language))
+    return "".join(parts)
+
+
+def interpretation_fingerprint(interpretation: Dict, language: str) -> str:
+    """Content hash naming a rendered interpretation"""
+    payload = json.dumps([language, interpretation], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@st.cache_resource(max_entries=256, show_spinner=False)
+def rendered_interpretation(fingerprint: str, language: str, _load: Callable[[], Optional[Dict]]) -> str:
+    """HTML of an interpretation, rendered once per fingerprint and shared by every session"""
+    # _load is only called on a miss, so a rerun showing the same results neither fetches nor renders them
+    return interpretation_html(_load(), language)
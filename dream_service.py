@@ -0,0 +1,276 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from dream_batch import interpret_record
+from dream_history import get_history_store
+from dream_journal import tone_of
+from dream_lexicon import get_lexicon, scan_dream
+from dream_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+LANGUAGES = ("english", "urdu")
+
+
+class RequestError(Exception):
+    """An error answered with an HTTP status and a JSON message"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class DreamHTTPServer(ThreadingHTTPServer):
+    """HTTP server sharing one interpreter, with at most `workers` interpretations running at once"""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        workers: int = 8,
+        max_body: int = 1 << 20,
+        max_batch: int = 100,
+        keep_alive: float = 5.0,
+        batch_timeout: float = 60.0,
+        interpreter=None,
+    ):
+        super().__init__(address, DreamRequestHandler)
+        self.workers = workers
+        self.max_body = max_body
+        self.max_batch = max_batch
+        self.keep_alive = keep_alive
+        self.batch_timeout = batch_timeout
+        self.interpreter = interpreter
+        self._slots = threading.BoundedSemaphore(workers)
+        # Shared by every batch and sized to half the slots, so batches never crowd out single requests
+        self._batch_executor = ThreadPoolExecutor(max_workers=max(1, workers // 2), thread_name_prefix="dream-batch")
+        self._lock = threading.Lock()
+        self._counters = {"requests": 0, "errors": 0, "in_flight": 0, "connections": 0, "batch_timeouts": 0}
+        metrics.register_collector("service", self.stats)
+
+    def get_interpreter(self):
+        """The shared interpreter, created on first use (after any fork)"""
+        if self.interpreter is None:
+            with self._lock:
+                if self.interpreter is None:
+                    from dream_interpreter import AdvancedDreamInterpreter
+                    self.interpreter = AdvancedDreamInterpreter()
+        return self.interpreter
+
+    def count(self, name: str, delta: int = 1):
+        with self._lock:
+            self._counters[name] += delta
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._counters, "workers": self.workers}
+
+    def run(self, work):
+        """Run one unit of interpretation work in a worker slot"""
+        with self._slots:
+            self.count("in_flight")
+            try:
+                return work()
+            finally:
+                self.count("in_flight", -1)
+
+    def run_batch(self, items: List, work: Callable[[int, Any], Dict]) -> List[Dict]:
+        """Run work on every item in parallel; items not finished within batch_timeout become error records"""
+        futures = [self._batch_executor.submit(self.run, partial(work, index, item)) for index, item in enumerate(items)]
+        done, _ = wait(futures, timeout=self.batch_timeout)
+        results = []
+        for index, (item, future) in enumerate(zip(items, futures)):
+            if future in done:
+                results.append(future.result())
+                continue
+            # Dreams already running finish in the background; their results are dropped
+            future.cancel()
+            self.count("batch_timeouts")
+            record_id = item.get("id", index) if isinstance(item, dict) else index
+            results.append({"id": record_id, "error": f"not interpreted within {self.batch_timeout}s"})
+        return results
+
+    def server_close(self):
+        super().server_close()
+        self._batch_executor.shutdown(wait=False, cancel_futures=True)
+
+
+class DreamRequestHandler(BaseHTTPRequestHandler):
+    """JSON endpoints over the shared interpreter"""
+
+    protocol_version = "HTTP/1.1"  # Keep-alive by default
+    server_version = "DreamInterpreter/1.0"
+    disable_nagle_algorithm = True  # Headers and body are separate writes on kept-alive connections
+
+    def setup(self):
+        # Idle keep-alive connections are closed after this many seconds
+        self.timeout = self.server.keep_alive
+        super().setup()
+        self.server.count("connections")
+
+    def finish(self):
+        super().finish()
+        self.server.count("connections", -1)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._respond(200, {"status": "ok", "lexicon": get_lexicon().version, "backend": self._backend_name()})
+        elif self.path == "/metrics":
+            self._respond(200, metrics.to_prometheus(), "text/plain; version=0.0.4")
+        else:
+            self._respond(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        routes = {"/interpret": self._interpret, "/interpret/batch": self._interpret_batch}
+        route = routes.get(self.path)
+        try:
+            if route is None:
+                raise RequestError(404, f"unknown path {self.path}")
+            self._respond(200, route(self._read_json()))
+        except RequestError as e:
+            self._respond(e.status, {"error": str(e)})
+        except Exception:
+            logger.exception("Failed to serve %s", self.path)
+            self._respond(500, {"error": "internal error"})
+
+    def _interpret(self, body: Dict) -> Dict:
+        text = body.get("text", body.get("dream"))
+        if not isinstance(text, str) or not text.strip():
+            raise RequestError(400, "text must be a non-empty string")
+        language = self._language(body)
+        sections = body.get("sections")
+        if sections is not None and not (isinstance(sections, list) and all(isinstance(s, str) for s in sections)):
+            raise RequestError(400, "sections must be a list of section names")
+        user_id = body.get("user_id")
+        interpreter = self.server.get_interpreter()
+        try:
+            interpretation = self.server.run(
+                lambda: interpreter.analyze_dream_with_ai(text, language, sections=sections, user_id=str(user_id) if user_id else None)
+            )
+        except ValueError as e:
+            raise RequestError(400, str(e)) from e
+        store = get_history_store()
+        # Only complete interpretations go into the history
+        if store is not None and sections is None:
+            scan = scan_dream(text)
+            store.record(text, language, interpretation, scan.themes, tone_of(scan), str(user_id or "anonymous"))
+        return {"language": language, "interpretation": interpretation}
+
+    def _interpret_batch(self, body: Dict) -> Dict:
+        dreams = body.get("dreams")
+        if not isinstance(dreams, list):
+            raise RequestError(400, "dreams must be a list")
+        if len(dreams) > self.server.max_batch:
+            raise RequestError(413, f"at most {self.server.max_batch} dreams per batch")
+        language = self._language(body)
+        interpreter = self.server.get_interpreter()
+        return {"results": self.server.run_batch(dreams, lambda index, item: interpret_record(interpreter, index, item, language))}
+
+    def _language(self, body: Dict) -> str:
+        language = str(body.get("language", "english")).lower()
+        if language not in LANGUAGES:
+            raise RequestError(400, f"language must be one of {', '.join(LANGUAGES)}")
+        return language
+
+    def _read_json(self) -> Dict:
+        length = self.headers.get("Content-Length")
+        if length is None or not length.isdigit():
+            self.close_connection = True
+            raise RequestError(411, "Content-Length required")
+        if int(length) > self.server.max_body:
+            # The body is left unread, so the connection cannot be reused
+            self.close_connection = True
+            raise RequestError(413, f"request body larger than {self.server.max_body} bytes")
+        try:
+            body = json.loads(self.rfile.read(int(length)))
+        except ValueError as e:
+            raise RequestError(400, f"invalid JSON: {e}") from e
+        if not isinstance(body, dict):
+            raise RequestError(400, "request body must be a JSON object")
+        return body
+
+    def _backend_name(self) -> Optional[str]:
+        backend = self.server.interpreter.backend if self.server.interpreter is not None else None
+        return backend.name if backend is not None else None
+
+    def _respond(self, status: int, payload, content_type: str = "application/json"):
+        self.server.count("requests")
+        if status >= 400:
+            self.server.count("errors")
+        if content_type == "application/json":
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        else:
+            body = payload.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8" if content_type == "application/json" else content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s %s", self.address_string(), format % args)
+
+
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    workers: int = 8,
+    processes: int = 1,
+    max_body: int = 1 << 20,
+    max_batch: int = 100,
+    keep_alive: float = 5.0,
+    batch_timeout: float = 60.0,
+):
+    """Serve the interpreter over HTTP; with processes > 1 forked workers share the listening socket"""
+    server = DreamHTTPServer((host, port), workers, max_body, max_batch, keep_alive, batch_timeout)
+    if processes > 1 and hasattr(os, "fork"):
+        for _ in range(processes - 1):
+            if os.fork() == 0:
+                break
+    logger.info("Serving on http://%s:%d (pid %d, %d workers)", host, server.server_address[1], os.getpid(), workers)
+    server.get_interpreter()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve the dream interpreter as an HTTP JSON API")
+    parser.add_argument("--host", default=os.environ.get("DREAM_SERVICE_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("DREAM_SERVICE_PORT", "8080")))
+    parser.add_argument("-w", "--workers", type=int, default=int(os.environ.get("DREAM_SERVICE_WORKERS", "8")),
+                        help="interpretations running at once per process")
+    parser.add_argument("-p", "--processes", type=int, default=int(os.environ.get("DREAM_SERVICE_PROCESSES", "1")),
+                        help="forked server processes sharing the port (POSIX only)")
+    parser.add_argument("--max-body", type=int, default=int(os.environ.get("DREAM_SERVICE_MAX_BODY", str(1 << 20))),
+                        help="largest accepted request body in bytes")
+    parser.add_argument("--max-batch", type=int, default=int(os.environ.get("DREAM_SERVICE_MAX_BATCH", "100")),
+                        help="most dreams accepted per batch request")
+    parser.add_argument("--keep-alive", type=float, default=float(os.environ.get("DREAM_SERVICE_KEEP_ALIVE", "5")),
+                        help="seconds an idle connection is kept open")
+    parser.add_argument("--batch-timeout", type=float, default=float(os.environ.get("DREAM_SERVICE_BATCH_TIMEOUT", "60")),
+                        help="seconds a batch request may take; dreams not done by then are returned as errors")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    serve(args.host, args.port, args.workers, args.processes, args.max_body, args.max_batch, args.keep_alive, args.batch_timeout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
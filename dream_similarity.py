@@ -0,0 +1,262 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from dream_cache import normalize_dream_text
+from dream_history import HistoryStore, get_history_store
+from dream_lexicon import get_lexicon
+from dream_matcher import DreamScan
+from dream_metrics import metrics, timed
+
+logger = logging.getLogger(__name__)
+
+WORD = re.compile(r"\w+")
+NEGATION = re.compile(r"\b(?:not|no|never|nothing|nobody|none|nor|neither|without|cannot|نہیں|نہ|مت)\b|n['’]t\b", re.IGNORECASE)
+THEME_DIMS = 32
+THEME_WEIGHT = 0.25  # Share of the cosine that comes from the detected themes
+SKETCH_BITS = 64
+SKETCH_SEED = 20240501
+
+VECTOR_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dream_vectors (
+    dream_id INTEGER PRIMARY KEY,
+    vector BLOB NOT NULL
+);
+"""
+
+
+def reuse_signature(dream_text: str, scan: DreamScan) -> Tuple:
+    """What the embedding misses but a reused interpretation must share: the tags, how often each cue occurs and the negations"""
+    cues = Counter((match.category, match.label) for match in scan.matches if match.category != "theme")
+    return scan.tags, cues, len(NEGATION.findall(dream_text))
+
+
+@lru_cache(maxsize=4)
+def _theme_positions(themes: Tuple[str, ...]) -> Dict[str, int]:
+    return {theme: i % THEME_DIMS for i, theme in enumerate(themes)}
+
+
+def embed(dream_text: str, themes: Sequence[str], dims: int = 128) -> np.ndarray:
+    """Unit vector of hashed word unigrams and bigrams, followed by a block for the detected themes"""
+    text_dims = dims - THEME_DIMS
+    words = np.array([zlib.crc32(word.encode("utf-8")) for word in WORD.findall(normalize_dream_text(dream_text))], dtype=np.uint32)
+    # Bigram hashes are mixed from the word hashes instead of hashing the word pairs again
+    hashes = np.concatenate([words, (words[:-1] * np.uint32(0x9E3779B1)) ^ words[1:]])
+    # Signed feature hashing: colliding features cancel out instead of piling up
+    signs = np.where(hashes & 0x80000000, 1.0, -1.0)
+    vector = np.zeros(dims, dtype=np.float32)
+    vector[:text_dims] = np.bincount(hashes % text_dims, weights=signs, minlength=text_dims)
+
+    positions = _theme_positions(tuple(get_lexicon().themes))
+    for theme in themes:
+        if theme in positions:
+            vector[text_dims + positions[theme]] = 1.0
+
+    text_norm = np.linalg.norm(vector[:text_dims])
+    theme_norm = np.linalg.norm(vector[text_dims:])
+    text_weight, theme_weight = (1 - THEME_WEIGHT, THEME_WEIGHT) if text_norm and theme_norm else (1.0, 1.0)
+    if text_norm:
+        vector[:text_dims] *= np.sqrt(text_weight) / text_norm
+    if theme_norm:
+        vector[text_dims:] *= np.sqrt(theme_weight) / theme_norm
+    return vector
+
+
+def sketch_radius(min_score: float) -> int:
+    """Hamming distance between two sketches that rows scoring min_score stay within, with a 4-sigma margin"""
+    # Each sketch bit differs with probability angle / pi
+    p = np.arccos(np.clip(min_score, -1.0, 1.0)) / np.pi
+    return int(np.ceil(SKETCH_BITS * p + 4 * np.sqrt(SKETCH_BITS * p * (1 - p))))
+
+
+class SimilarMatch(NamedTuple):
+    dream_id: int
+    score: float  # Cosine similarity
+
+
+class SimilarityIndex:
+    """Contiguous float32 matrix of dream embeddings with appendable rows and top-k cosine search"""
+
+    def __init__(self, dims: int = 128, capacity: int = 1024):
+        self.dims = dims
+        self.size = 0
+        self.searches = 0
+        self._vectors = np.zeros((capacity, dims), dtype=np.float32)
+        self._sketches = np.zeros(capacity, dtype=np.uint64)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._users = np.zeros(capacity, dtype=np.int32)
+        self._user_codes: Dict[str, int] = {}
+        self._planes = np.random.default_rng(SKETCH_SEED).standard_normal((dims, SKETCH_BITS)).astype(np.float32)
+        self._lock = threading.Lock()
+
+    def sketch(self, vectors: np.ndarray) -> np.ndarray:
+        """64-bit SimHash of each row: the signs of fixed random projections"""
+        bits = np.atleast_2d(vectors) @ self._planes > 0
+        return np.packbits(bits, axis=1).view(np.uint64).ravel()
+
+    def append(self, ids: Sequence[int], vectors: np.ndarray, user_ids: Sequence[str]):
+        """Add rows, doubling the arrays when they are full"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dims)
+        sketches = self.sketch(vectors)
+        with self._lock:
+            users = [self._user_codes.setdefault(user_id, len(self._user_codes)) for user_id in user_ids]
+            end = self.size + len(vectors)
+            if end > len(self._ids):
+                capacity = max(end, 2 * len(self._ids))
+                # Searches already running keep the old arrays, which stay valid up to their size
+                self._vectors = np.concatenate([self._vectors[:self.size], np.zeros((capacity - self.size, self.dims), np.float32)])
+                self._sketches = np.concatenate([self._sketches[:self.size], np.zeros(capacity - self.size, np.uint64)])
+                self._ids = np.concatenate([self._ids[:self.size], np.zeros(capacity - self.size, np.int64)])
+                self._users = np.concatenate([self._users[:self.size], np.zeros(capacity - self.size, np.int32)])
+            self._vectors[self.size:end] = vectors
+            self._sketches[self.size:end] = sketches
+            self._ids[self.size:end] = ids
+            self._users[self.size:end] = users
+            self.size = end
+
+    @timed("similar_search")
+    def search(
+        self, vector: np.ndarray, k: int = 5, user_id: Optional[str] = None, min_score: Optional[float] = None
+    ) -> List[SimilarMatch]:
+        """The k rows most similar to vector, optionally only one user's and only those scoring at least min_score"""
+        with self._lock:
+            size = self.size
+            vectors, sketches, ids, users = self._vectors, self._sketches, self._ids, self._users
+            user = self._user_codes.get(user_id) if user_id is not None else None
+            self.searches += 1
+        if size == 0 or (user_id is not None and user is None):
+            return []
+
+        if user is not None:
+            rows = np.flatnonzero(users[:size] == user)
+        elif min_score is not None and min_score > 0:
+            # Only rows whose sketch is close enough to possibly reach min_score are scored exactly
+            distances = np.bitwise_count(sketches[:size] ^ self.sketch(vector)[0])
+            rows = np.flatnonzero(distances <= sketch_radius(min_score))
+            if len(rows) > size // 8:
+                rows = None  # Gathering that many rows costs more than scoring them all
+        else:
+            rows = None
+        scores = vectors[:size] @ vector if rows is None else vectors[rows] @ vector
+        if min_score is not None:
+            keep = np.flatnonzero(scores >= min_score)
+            rows, scores = (keep if rows is None else rows[keep]), scores[keep]
+
+        top = np.argpartition(-scores, k)[:k] if len(scores) > k else np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [SimilarMatch(int(ids[i if rows is None else rows[i]]), float(scores[i])) for i in top]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": self.size, "users": len(self._user_codes), "searches": self.searches}
+
+
+class SimilarDreams:
+    """Similarity index over the dream history, caught up with it before every search"""
+
+    def __init__(
+        self, store: HistoryStore, dims: int = 128, near_duplicate: float = 0.97, cross_user: bool = False, batch_size: int = 10000
+    ):
+        self.store = store
+        self.index = SimilarityIndex(dims)
+        self.near_duplicate = near_duplicate  # Above 1, near-duplicates are never reused
+        self.cross_user = cross_user  # Whether one user's dreams may lend their interpretation to another's
+        self.batch_size = batch_size
+        self.reused = 0
+        self._last_id = 0
+        self._refresh_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._db = sqlite3.connect(store.path, check_same_thread=False, timeout=30)
+        self._db.executescript(VECTOR_SCHEMA)
+        stored = self._db.execute("SELECT vector FROM dream_vectors LIMIT 1").fetchone()
+        if stored is not None and len(stored[0]) != dims * 4:
+            logger.warning("Stored dream vectors do not have %d dimensions; re-embedding the history", dims)
+            with self._db:
+                self._db.execute("DELETE FROM dream_vectors")
+        self.refresh()
+
+    def refresh(self):
+        """Embed dreams written since the last refresh (by any process) and append them to the index"""
+        with self._refresh_lock:
+            while True:
+                rows = self._db.execute(
+                    "SELECT id, themes, dream_text FROM dreams "
+                    "WHERE id > (SELECT COALESCE(MAX(dream_id), 0) FROM dream_vectors) ORDER BY id LIMIT ?",
+                    (self.batch_size,),
+                ).fetchall()
+                if not rows:
+                    break
+                with self._db:
+                    self._db.executemany(
+                        "INSERT OR IGNORE INTO dream_vectors (dream_id, vector) VALUES (?, ?)",
+                        [(dream_id, embed(text, json.loads(themes), self.index.dims).tobytes()) for dream_id, themes, text in rows],
+                    )
+
+            rows = self._db.execute(
+                "SELECT v.dream_id, d.user_id, v.vector FROM dream_vectors v JOIN dreams d ON d.id = v.dream_id "
+                "WHERE v.dream_id > ? ORDER BY v.dream_id",
+                (self._last_id,),
+            ).fetchall()
+            if rows:
+                vectors = np.frombuffer(b"".join(row[2] for row in rows), dtype=np.float32)
+                self.index.append([row[0] for row in rows], vectors, [row[1] for row in rows])
+                self._last_id = rows[-1][0]
+
+    def similar(
+        self,
+        dream_text: str,
+        themes: Sequence[str],
+        k: int = 5,
+        user_id: Optional[str] = None,
+        min_score: Optional[float] = None,
+    ) -> List[SimilarMatch]:
+        """Past dreams most similar to this one, optionally only the given user's"""
+        self.refresh()
+        return self.index.search(embed(dream_text, themes, self.index.dims), k, user_id, min_score)
+
+    def near_duplicates(self, dream_text: str, scan: DreamScan, user_id: Optional[str] = None, k: int = 3) -> List[str]:
+        """Texts of the user's past dreams at least `near_duplicate` similar to this one with the same cues, most similar first"""
+        if self.near_duplicate > 1 or (user_id is None and not self.cross_user):
+            return []
+        matches = self.similar(dream_text, scan.themes, k, None if self.cross_user else user_id, self.near_duplicate)
+        entries = self.store.entries([match.dream_id for match in matches])
+        signature, lexicon = reuse_signature(dream_text, scan), get_lexicon()
+        texts = []
+        for match in matches:
+            past_text = entries[match.dream_id]["dream_text"] if match.dream_id in entries else None
+            # A flipped feeling or an added "not" barely moves the embedding but changes the reading
+            if past_text is not None and reuse_signature(past_text, lexicon.scan(past_text)) == signature:
+                texts.append(past_text)
+        return texts
+
+    def count_reuse(self):
+        with self._stats_lock:
+            self.reused += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.index.stats(), "reused": self.reused}
+
+
+@lru_cache(maxsize=None)
+def get_similar_dreams() -> Optional[SimilarDreams]:
+    """Return the similarity index shared by every session, or None when the history is disabled"""
+    store = get_history_store()
+    if store is None:
+        return None
+    similar = SimilarDreams(
+        store,
+        dims=int(os.environ.get("DREAM_SIMILARITY_DIMS", "128")),
+        near_duplicate=float(os.environ.get("DREAM_NEAR_DUPLICATE", "0.97")),
+        cross_user=os.environ.get("DREAM_NEAR_DUPLICATE_CROSS_USER", "").lower() in ("1", "true", "yes"),
+    )
+    metrics.register_collector("similarity", similar.stats)
+    return similar
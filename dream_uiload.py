@@ -0,0 +1,235 @@
+import argparse
+import gc
+import json
+import logging
+import multiprocessing
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from streamlit.testing.v1 import AppTest
+
+from dream_backends import INTERPRETATION_KEYS, LIST_SECTIONS
+from dream_workload import percentile, synthetic_dream
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dream_interpreter.py")
+CYCLE = ("submit", "rerun", "language")
+
+
+def _stub_reply() -> Dict:
+    return {
+        section: [f"Stub {section} item {i}" for i in range(3)] if section in LIST_SECTIONS else f"Stub {section}."
+        for section in INTERPRETATION_KEYS
+    }
+
+
+class StubBackendHandler(BaseHTTPRequestHandler):
+    """OpenAI-compatible chat completions that answer after a fixed delay, as JSON or as an event stream"""
+
+    protocol_version = "HTTP/1.1"
+    latency = 0.05
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.server.lock:
+            self.server.requests += 1
+        reply = _stub_reply()
+        if not payload.get("stream"):
+            time.sleep(self.latency)
+            body = json.dumps({"choices": [{"message": {"content": json.dumps(reply)}}]}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        lines = []
+        for section, value in reply.items():
+            lines.append(f"## {section}")
+            if isinstance(value, list):
+                lines.extend(f"- {item}" for item in value)
+            else:
+                lines.append(value)
+        pieces = [line + "\n" for line in lines]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        # The delay is spread over the stream, so the first token comes early as it does from a real model
+        for piece in pieces:
+            time.sleep(self.latency / len(pieces))
+            self._chunk(f"data: {json.dumps({'choices': [{'delta': {'content': piece}}]})}\n\n")
+        self._chunk("data: [DONE]\n\n")
+        self._chunk("")
+
+    def _chunk(self, text: str):
+        data = text.encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+
+def start_stub_backend(latency: float) -> Tuple[ThreadingHTTPServer, str]:
+    """Serve the stub backend on a free local port and return the server and its URL"""
+    handler = type("Handler", (StubBackendHandler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    server.lock, server.requests = threading.Lock(), 0
+    threading.Thread(target=server.serve_forever, name="dream-stub-backend", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/v1/chat/completions"
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process"""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _session(index: int, cycles: int, dreams: List[str], timeout: float, start, results):
+    """Drive one simulated user through submit, rerun and language-toggle cycles in its own process"""
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel(logging.ERROR)
+    latencies: Dict[str, List[float]] = {kind: [] for kind in CYCLE}
+    errors: List[str] = []
+    app = AppTest.from_file(SCRIPT, default_timeout=timeout)
+
+    def rerun(kind: str):
+        started = time.perf_counter()
+        app.run()
+        latencies[kind].append(time.perf_counter() - started)
+        if app.exception:
+            errors.append(f"{kind}: {app.exception[0].message}")
+
+    rss_start = 0
+    try:
+        app.run()
+        gc.collect()
+        rss_start = rss_bytes()
+        start.wait()
+        for cycle in range(cycles):
+            app.text_area(key="dream_input").input(dreams[(index * cycles + cycle) % len(dreams)])
+            next(button for button in app.button if button.label.startswith("🔮")).click()
+            rerun("submit")
+            rerun("rerun")
+            app.radio[0].set_value("Urdu" if app.radio[0].value == "English" else "English")
+            rerun("language")
+    except Exception as e:
+        errors.append(f"{type(e).__name__}: {e}")
+    gc.collect()
+    results.put((index, latencies, errors, rss_start, rss_bytes()))
+
+
+def _summary(samples: List[float]) -> Dict:
+    if not samples:
+        return {"reruns": 0}
+    return {
+        "reruns": len(samples),
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "max_ms": max(samples) * 1000,
+    }
+
+
+def run(sessions: int, cycles: int, size: int, density: float, distinct: int, backend_latency: Optional[float], timeout: float = 60.0) -> Dict:
+    """Run concurrent app sessions through the real script and report rerun latency, throughput and memory"""
+    server = None
+    if backend_latency is not None:
+        server, url = start_stub_backend(backend_latency)
+        os.environ.update({"DREAM_BACKEND": "openai", "DREAM_BACKEND_URL": url, "OPENAI_API_KEY": "stub"})
+    dreams = [synthetic_dream(size, density, "english", seed) for seed in range(distinct)]
+
+    # AppTest installs a process-wide Streamlit runtime for every run, so each session needs a process of its own
+    context = multiprocessing.get_context("spawn")
+    start, queue = context.Barrier(sessions + 1), context.Queue()
+    workers = [
+        context.Process(target=_session, args=(i, cycles, dreams, timeout, start, queue), name=f"dream-session-{i}", daemon=True)
+        for i in range(sessions)
+    ]
+    for worker in workers:
+        worker.start()
+    # Every session has rendered the page once before the clock starts
+    start.wait(timeout)
+    started = time.perf_counter()
+    requests_before = server.requests if server else 0
+    results = {}
+    for _ in workers:
+        index, latencies, errors, rss_start, rss_end = queue.get(timeout=timeout * (3 * cycles + 1))
+        results[index] = (latencies, errors, rss_start, rss_end)
+    elapsed = time.perf_counter() - started
+    for worker in workers:
+        worker.join()
+
+    by_kind = {kind: [sample for latencies, *_ in results.values() for sample in latencies[kind]] for kind in CYCLE}
+    everything = [sample for samples in by_kind.values() for sample in samples]
+    errors = [error for _, session_errors, *_ in results.values() for error in session_errors]
+    rss_start = [result[2] for result in results.values()]
+    growth = [result[3] - result[2] for result in results.values()]
+    return {
+        "sessions": sessions,
+        "cycles_per_session": cycles,
+        "backend_latency_s": backend_latency,
+        "backend_requests": server.requests - requests_before if server else 0,
+        "duration_s": elapsed,
+        "reruns_per_s": len(everything) / elapsed,
+        "cycles_per_s": len(by_kind["submit"]) / elapsed,
+        "all": _summary(everything),
+        **{kind: _summary(samples) for kind, samples in by_kind.items()},
+        # Per session process: after the first render, then growth over the cycles
+        "rss_start_mb": statistics.fmean(rss_start) / 2**20,
+        "rss_growth_per_session_kb": statistics.fmean(growth) / 1024,
+        "rss_growth_max_kb": max(growth) / 1024,
+        "errors": errors,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test the Streamlit app with concurrent simulated sessions")
+    parser.add_argument("-s", "--sessions", type=int, default=8, help="concurrent sessions")
+    parser.add_argument("-n", "--cycles", type=int, default=5, help="submit, rerun and language-toggle cycles per session")
+    parser.add_argument("--size", type=int, default=600, help="dream length in characters")
+    parser.add_argument("--density", type=float, default=0.05, help="keyword density of the synthetic dreams")
+    parser.add_argument("--distinct", type=int, default=32, help="distinct dreams shared by all sessions (lower means more cache hits)")
+    parser.add_argument("--backend-latency", type=float, default=0.2, help="seconds the stub backend takes per reply")
+    parser.add_argument("--no-backend", action="store_true", help="rule-based interpretation only")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds one rerun may take")
+    parser.add_argument("-o", "--output", default=None, help="write the report as JSON")
+    args = parser.parse_args(argv)
+    # AppTest runs the script outside a Streamlit server, which Streamlit warns about on every thread
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel(logging.ERROR)
+
+    report = run(
+        args.sessions, args.cycles, args.size, args.density, args.distinct,
+        None if args.no_backend else args.backend_latency, args.timeout,
+    )
+    for kind in ("all", *CYCLE):
+        summary = report[kind]
+        if summary["reruns"]:
+            print(
+                f"{kind:9} {summary['reruns']:5} reruns  p50 {summary['p50_ms']:8.1f} ms  "
+                f"p95 {summary['p95_ms']:8.1f} ms  p99 {summary['p99_ms']:8.1f} ms  max {summary['max_ms']:8.1f} ms",
+                file=sys.stderr,
+            )
+    print(
+        f"{report['sessions']} sessions in {report['duration_s']:.1f}s  {report['reruns_per_s']:.1f} reruns/s  "
+        f"RSS {report['rss_start_mb']:.0f} MB per process + {report['rss_growth_per_session_kb']:.0f} KB per session "
+        f"(max {report['rss_growth_max_kb']:.0f} KB)  "
+        f"{report['backend_requests']} backend requests  errors {len(report['errors'])}",
+        file=sys.stderr,
+    )
+    for error in report["errors"][:10]:
+        print(f"  {error}", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0 if report["all"]["reruns"] and not report["errors"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
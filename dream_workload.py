@@ -0,0 +1,47 @@
+import random
+from typing import List
+
+from dream_lexicon import read_lexicon_source
+
+FILLER_WORDS = {
+    "english": [
+        "i", "was", "in", "a", "the", "and", "then", "saw", "walking", "with", "my", "old", "friend",
+        "near", "it", "felt", "very", "strange", "suddenly", "there", "were", "people", "talking",
+        "about", "something", "long", "ago", "we", "went", "towards", "bright", "place", "again",
+    ],
+    "urdu": [
+        "میں", "نے", "خواب", "دیکھا", "کہ", "ایک", "اور", "پھر", "وہاں", "بہت", "سارے", "لوگ",
+        "تھے", "میرا", "دوست", "ساتھ", "چل", "رہا", "تھا", "اچانک", "کچھ", "عجیب", "ہوا", "سب",
+    ],
+}
+
+
+def lexicon_keywords(language: str) -> List[str]:
+    """All lexicon keywords of one language"""
+    lexicon = read_lexicon_source()
+    keywords = set()
+    for labels in [lexicon["themes"], *lexicon["cues"].values()]:
+        for languages in labels.values():
+            keywords.update(languages.get(language, []))
+    return sorted(keywords)
+
+
+def synthetic_dream(length: int, density: float, language: str, seed: int = 0) -> str:
+    """Generate a reproducible dream of about length characters with the given keyword density"""
+    rng = random.Random(f"{seed}:{length}:{density}:{language}")
+    keywords, filler = lexicon_keywords(language), FILLER_WORDS[language]
+    stop = "." if language == "english" else "۔"
+    words, size = [], 0
+    while size < length:
+        word = rng.choice(keywords) if rng.random() < density else rng.choice(filler)
+        if rng.random() < 0.08:
+            word += stop
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)[:length]
+
+
+def percentile(samples: List[float], percent: float) -> float:
+    """The given percentile of the samples, picking the nearest sample"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))]
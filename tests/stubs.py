@@ -0,0 +1,68 @@
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dream_backends import INTERPRETATION_KEYS, LIST_SECTIONS
+
+
+def stub_interpretation(tag: str = "Stub") -> dict:
+    return {
+        section: [f"{tag} {section}"] if section in LIST_SECTIONS else f"{tag} {section}."
+        for section in INTERPRETATION_KEYS
+    }
+
+
+class StubProviderHandler(BaseHTTPRequestHandler):
+    """OpenAI-compatible chat completions that answer after the server's delay, with any queued error statuses first"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            status = server.statuses.popleft() if server.statuses else 200
+        try:
+            time.sleep(server.delay)
+            body = json.dumps({"choices": [{"message": {"content": json.dumps(stub_interpretation(server.tag))}}]})
+            self._reply(status, body.encode("utf-8") if status == 200 else b"{}")
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _reply(self, status: int, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StubProvider(ThreadingHTTPServer):
+    """Local stub provider that counts requests and the most it had in flight at once"""
+
+    daemon_threads = True
+
+    def __init__(self, delay: float = 0.0, statuses=(), tag: str = "Stub"):
+        super().__init__(("127.0.0.1", 0), StubProviderHandler)
+        self.delay, self.tag = delay, tag
+        self.statuses = deque(statuses)
+        self.lock = threading.Lock()
+        self.requests = self.in_flight = self.max_in_flight = 0
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}/v1/chat/completions"
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+
+from dream_backends import AdmissionController, BackendError, BackendOverloaded, OpenAIBackend
+from dream_interpreter import ISLAMIC_GUIDELINES
+from stubs import StubProvider
+
+
+@pytest.fixture
+def provider():
+    server = StubProvider(delay=0.2)
+    yield server
+    server.stop()
+
+
+def _run_all(target, count):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_provider_never_sees_more_than_the_concurrency_limit(provider):
+    admission = AdmissionController("stub", concurrency=2, max_wait=10)
+    backend = OpenAIBackend(provider.url, "stub", admission=admission)
+    _run_all(lambda: backend.interpret("A river at night.", "english", ISLAMIC_GUIDELINES), 6)
+
+    assert provider.requests == 6
+    assert provider.max_in_flight == 2
+    assert admission.stats()["active"] == 0
+
+
+def test_full_queue_is_rejected_with_a_backend_error(provider):
+    admission = AdmissionController("stub", concurrency=1, max_queue=2, max_wait=10)
+    backend = OpenAIBackend(provider.url, "stub", admission=admission)
+    errors = []
+
+    def call():
+        try:
+            backend.interpret("A river at night.", "english", ISLAMIC_GUIDELINES)
+        except BackendError as e:
+            errors.append(e)
+
+    # One call runs, two wait in the queue and the rest find it full
+    _run_all(call, 6)
+
+    assert provider.requests == 3
+    assert len(errors) == 3 and all(isinstance(e, BackendOverloaded) for e in errors)
+    assert admission.stats()["rejected"] == 3
+
+
+def test_wait_past_the_queue_timeout_is_rejected():
+    admission = AdmissionController("stub", concurrency=1, max_wait=0.1)
+    admission.acquire()
+    started = time.monotonic()
+    with pytest.raises(BackendOverloaded):
+        admission.acquire()
+    assert 0.1 <= time.monotonic() - started < 1
+    assert admission.stats()["timed_out"] == 1
+
+
+def test_waiters_are_admitted_in_arrival_order():
+    admission = AdmissionController("stub", concurrency=1, max_wait=10)
+    admission.acquire()
+    order = []
+
+    def wait(index):
+        admission.acquire()
+        order.append(index)
+        admission.release()
+
+    threads = []
+    for index in range(5):
+        threads.append(threading.Thread(target=wait, args=(index,)))
+        threads[-1].start()
+        # Each waiter is queued before the next one arrives
+        while admission.stats()["queue_depth"] <= index:
+            time.sleep(0.001)
+    admission.release()
+    for thread in threads:
+        thread.join()
+
+    assert order == list(range(5))
+
+
+def test_token_bucket_limits_the_request_rate():
+    admission = AdmissionController("stub", concurrency=10, rate=20, burst=2, max_wait=10)
+    started = time.monotonic()
+    for _ in range(6):
+        admission.acquire()
+        admission.release()
+    # Two tokens up front, then one every 50ms
+    assert 0.18 <= time.monotonic() - started < 0.5
@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+from dream_backends import INTERPRETATION_KEYS, AdmissionController, BackendError, OpenAIBackend
+from dream_cache import InterpretationCache
+from dream_interpreter import ISLAMIC_GUIDELINES, AdvancedDreamInterpreter
+from stubs import StubProvider, stub_interpretation
+
+DREAM = "I swam in a river under the moon."
+
+
+@pytest.fixture
+def provider_for():
+    servers = []
+
+    def make(**stub):
+        servers.append(StubProvider(**stub))
+        return servers[-1]
+
+    yield make
+    for server in servers:
+        server.stop()
+
+
+def _backend(url, **options):
+    options.setdefault("backoff", 0.01)
+    return OpenAIBackend(url, "stub", admission=AdmissionController("stub", max_wait=10), **options)
+
+
+@pytest.mark.parametrize("statuses", [[429], [503], [429, 503]])
+def test_rate_limited_and_unavailable_replies_are_retried(provider_for, statuses):
+    provider = provider_for(statuses=statuses)
+    assert _backend(provider.url).interpret(DREAM, "english", ISLAMIC_GUIDELINES) == stub_interpretation()
+    assert provider.requests == len(statuses) + 1
+
+
+def test_retries_give_up_after_the_last_attempt(provider_for):
+    provider = provider_for(statuses=[503] * 3)
+    with pytest.raises(BackendError, match="HTTP 503"):
+        _backend(provider.url, retries=2).interpret(DREAM, "english", ISLAMIC_GUIDELINES)
+    assert provider.requests == 3
+
+
+def test_client_errors_are_not_retried(provider_for):
+    provider = provider_for(statuses=[400])
+    with pytest.raises(BackendError, match="HTTP 400"):
+        _backend(provider.url).interpret(DREAM, "english", ISLAMIC_GUIDELINES)
+    assert provider.requests == 1
+
+
+def test_slow_provider_is_cut_off_at_the_deadline(provider_for):
+    provider = provider_for(delay=2.0)
+    started = time.monotonic()
+    with pytest.raises(BackendError):
+        _backend(provider.url, deadline=0.3).interpret(DREAM, "english", ISLAMIC_GUIDELINES)
+    assert time.monotonic() - started < 1.0
+
+
+@pytest.mark.parametrize("url, api_key", [
+    ("http://", "stub"),  # no host
+    ("127.0.0.1/v1/chat/completions", "stub"),  # no scheme
+    (None, "stub\nkey"),  # header value with a newline
+])
+def test_invalid_requests_raise_backend_errors(provider_for, url, api_key):
+    backend = OpenAIBackend(url or provider_for().url, api_key, admission=AdmissionController("stub"))
+    with pytest.raises(BackendError):
+        backend.interpret(DREAM, "english", ISLAMIC_GUIDELINES)
+    with pytest.raises(BackendError):
+        list(backend.stream(DREAM, "english", ISLAMIC_GUIDELINES))
+
+
+@pytest.mark.parametrize("make_backend", [
+    lambda provider: _backend(provider.url, retries=1),  # every attempt answers 503
+    lambda provider: OpenAIBackend("http://", "stub", admission=AdmissionController("stub")),
+])
+def test_interpreter_falls_back_to_the_rules(provider_for, make_backend):
+    provider = provider_for(statuses=[503] * 10)
+    rules = AdvancedDreamInterpreter(cache=InterpretationCache())
+    rules.backend = None
+    expected = rules.analyze_dream_with_ai(DREAM, "english")
+
+    interpreter = AdvancedDreamInterpreter(backend=make_backend(provider), cache=InterpretationCache())
+    assert interpreter.analyze_dream_with_ai(DREAM, "english") == expected
+    streamed = {
+        event.section: event.data
+        for event in interpreter.analyze_dream_with_ai_stream(DREAM, "english")
+        if event.kind == "section"
+    }
+    assert set(streamed) == set(INTERPRETATION_KEYS)
+    assert streamed == expected
@@ -0,0 +1,44 @@
+import threading
+
+import pytest
+
+from dream_backends import INTERPRETATION_KEYS, AdmissionController, BackendOverloaded, OpenAIBackend
+from dream_fanout import SectionFanout, fanout_from_env
+from dream_interpreter import ISLAMIC_GUIDELINES
+from stubs import StubProvider
+
+
+@pytest.fixture
+def provider():
+    server = StubProvider(delay=0.1)
+    yield server
+    server.stop()
+
+
+def test_concurrent_fanouts_stay_within_the_provider_concurrency(provider):
+    admission = AdmissionController("stub", concurrency=len(INTERPRETATION_KEYS), max_wait=10)
+    fanout = SectionFanout(OpenAIBackend(provider.url, "stub", admission=admission), section_timeout=10)
+    results = []
+
+    def run():
+        results.append(fanout.interpret("I saw a river at night.", "english", ISLAMIC_GUIDELINES, INTERPRETATION_KEYS))
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert provider.requests == 4 * len(INTERPRETATION_KEYS)
+    assert provider.max_in_flight <= admission.concurrency
+    assert all(set(result) == set(INTERPRETATION_KEYS) for result in results)
+    assert admission.stats()["active"] == 0
+
+
+def test_fanout_needs_a_slot_per_section(provider, monkeypatch):
+    admission = AdmissionController("stub", concurrency=len(INTERPRETATION_KEYS) - 1)
+    with pytest.raises(BackendOverloaded):
+        admission.acquire(slots=len(INTERPRETATION_KEYS))
+
+    monkeypatch.setenv("DREAM_FANOUT", "1")
+    assert fanout_from_env(OpenAIBackend(provider.url, "stub", admission=admission), {}) is None
@@ -0,0 +1,61 @@
+import pytest
+
+from dream_history import HistoryStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    # The writer only flushes when asked, so the tests decide what is still queued
+    store = HistoryStore(str(tmp_path / "history.db"), batch_size=1000, flush_interval=60)
+    yield store
+    store.close()
+
+
+def _record(store, text, created_at, user_id="u1", themes=("water",)):
+    store.record(text, "english", {"summary": text}, themes, "neutral", user_id, created_at)
+
+
+def _walk(page_through):
+    texts, cursor = [], None
+    while True:
+        page = page_through(cursor)
+        texts.extend(entry["dream_text"] for entry in page.entries)
+        if page.cursor is None:
+            return texts
+        cursor = page.cursor
+
+
+def test_user_pages_cross_equal_timestamps_without_duplicates_or_gaps(store):
+    # Runs of dreams share a timestamp, so only the id separates them
+    for i in range(23):
+        _record(store, f"dream {i}", 1000.0 + i // 4)
+    _record(store, "someone else's", 1002.0, user_id="u2")
+    store.flush()
+
+    texts = _walk(lambda cursor: store.user_dreams("u1", 3, cursor))
+    assert texts == [f"dream {i}" for i in sorted(range(23), key=lambda i: (i // 4, i), reverse=True)]
+
+
+def test_theme_pages_cross_equal_timestamps_without_duplicates_or_gaps(store):
+    for i in range(17):
+        _record(store, f"dream {i}", 1000.0 + i // 5, themes=("water", "animals") if i % 2 else ("water",))
+    store.flush()
+
+    assert len(_walk(lambda cursor: store.dreams_with_theme("water", limit=4, cursor=cursor))) == 17
+    animals = _walk(lambda cursor: store.dreams_with_theme("animals", limit=2, cursor=cursor))
+    assert sorted(animals) == sorted(f"dream {i}" for i in range(17) if i % 2) and len(set(animals)) == len(animals)
+
+
+def test_reads_see_queued_writes_without_flushing(store):
+    for i in range(5):
+        _record(store, f"written {i}", 1000.0)
+    store.flush()
+    # Queued dreams share their times with each other and with written ones
+    for i in range(4):
+        _record(store, f"queued {i}", 1000.0 + i // 2)
+    flushes = store.stats()["flushes"]
+
+    texts = _walk(lambda cursor: store.user_dreams("u1", 2, cursor))
+
+    assert texts == [f"queued {i}" for i in reversed(range(4))] + [f"written {i}" for i in reversed(range(5))]
+    assert store.stats() == {"written": 5, "flushes": flushes, "pending": 4}
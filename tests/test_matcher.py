@@ -0,0 +1,63 @@
+import json
+import os
+
+import pytest
+
+from dream_matcher import RegexMatcher, SymbolMatcher
+
+LEXICON_SOURCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lexicon.json")
+
+
+@pytest.fixture(scope="module", params=[SymbolMatcher, RegexMatcher])
+def matcher(request):
+    with open(LEXICON_SOURCE, encoding="utf-8") as f:
+        return request.param.from_lexicon(json.load(f))
+
+
+def _keywords(matcher, text):
+    return {match.keyword for match in matcher.find(text)}
+
+
+@pytest.mark.parametrize("text, keyword", [
+    ("I walked peacefully home", "peacefully"),
+    ("The snakes were gone", "snake"),
+    ("Two cars passed", "car"),
+    ("The children laughed", "children"),
+    ("Darkness fell", "darkness"),
+])
+def test_english_words_and_their_forms_match(matcher, text, keyword):
+    assert keyword in _keywords(matcher, text)
+
+
+@pytest.mark.parametrize("text, keyword", [
+    ("It was scary", "car"),
+    ("A red carpet", "car"),
+    ("My sonnet", "son"),
+    ("A catalogue of seashells", "cat"),
+])
+def test_keywords_inside_longer_words_do_not_match(matcher, text, keyword):
+    assert keyword not in _keywords(matcher, text)
+
+
+def test_peacefully_reads_as_a_positive_true_dream(matcher):
+    scan = matcher.scan("I walked peacefully through the garden")
+    assert scan.has("tone", "positive") and scan.has("dream_type", "true")
+
+
+@pytest.mark.parametrize("text, keyword, matched", [
+    ("میں نے پانی دیکھا", "پانی", "پانی"),
+    ("دریا، اور سمندر", "دریا", "دریا"),
+    ("میں نے پانیٔ دیکھا", "پانی", "پانیٔ"),  # hamza above on the last letter
+    ("وہ گھرِ میں تھا", "گھر", "گھرِ"),  # zer on the last letter
+])
+def test_urdu_words_match_with_trailing_diacritics(matcher, text, keyword, matched):
+    match = next(match for match in matcher.find(text) if match.keyword == keyword)
+    assert text[match.start:match.end] == matched
+
+
+@pytest.mark.parametrize("text, keyword", [
+    ("گھروالا", "گھر"),
+    ("بادریا", "دریا"),
+])
+def test_urdu_keywords_inside_longer_words_do_not_match(matcher, text, keyword):
+    assert keyword not in _keywords(matcher, text)
@@ -0,0 +1,92 @@
+import json
+import threading
+import time
+import urllib.request
+
+import pytest
+
+import dream_service
+from dream_service import DreamHTTPServer
+
+
+class SlowInterpreter:
+    """Interpreter stand-in that takes a fixed time per dream and records how many run at once"""
+
+    backend = None
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.running = self.max_running = 0
+
+    def analyze_dream_with_ai(self, text, language, sections=None, user_id=None):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+        keys = sections if sections is not None else ["summary", "overall_assessment"]
+        return {key: f"{key} of {text}" for key in keys}
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(interpreter, **options):
+        servers.append(DreamHTTPServer(("127.0.0.1", 0), interpreter=interpreter, **options))
+        threading.Thread(target=servers[-1].serve_forever, daemon=True).start()
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _post(server, path, body):
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{server.server_port}{path}", json.dumps(body).encode("utf-8"), {"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def test_batch_dreams_run_in_parallel(serve):
+    interpreter = SlowInterpreter(0.2)
+    server = serve(interpreter, workers=8)
+    started = time.monotonic()
+    results = _post(server, "/interpret/batch", {"dreams": [f"dream {i}" for i in range(8)]})["results"]
+
+    assert [result["id"] for result in results] == list(range(8))
+    assert all("interpretation" in result for result in results)
+    # Half the worker slots are open to batches
+    assert interpreter.max_running == 4
+    assert time.monotonic() - started < 0.2 * 8 / 2
+
+
+def test_batch_returns_unfinished_dreams_as_errors_at_its_deadline(serve):
+    server = serve(SlowInterpreter(0.3), workers=4, batch_timeout=0.45)
+    started = time.monotonic()
+    results = _post(server, "/interpret/batch", {"dreams": [{"id": f"d{i}", "text": f"dream {i}"} for i in range(6)]})["results"]
+
+    assert time.monotonic() - started < 1.0
+    assert [result["id"] for result in results] == [f"d{i}" for i in range(6)]
+    assert ["interpretation" in result for result in results] == [True, True, False, False, False, False]
+    assert server.stats()["batch_timeouts"] == 4
+
+
+def test_only_complete_interpretations_are_recorded(serve, monkeypatch):
+    recorded = []
+
+    class Store:
+        def record(self, text, language, interpretation, themes, tone, user_id):
+            recorded.append(interpretation)
+
+    monkeypatch.setattr(dream_service, "get_history_store", Store)
+    server = serve(SlowInterpreter(0))
+    _post(server, "/interpret", {"text": "A river", "sections": ["summary"]})
+    _post(server, "/interpret", {"text": "A river"})
+
+    assert recorded == [{"summary": "summary of A river", "overall_assessment": "overall_assessment of A river"}]
@@ -0,0 +1,50 @@
+import pytest
+
+from dream_history import HistoryStore
+from dream_lexicon import scan_dream
+from dream_similarity import SimilarDreams
+from stubs import stub_interpretation
+
+PAST = (
+    "I was walking along a quiet river at night with my mother. "
+    "A white bird landed on the water in front of us. "
+    "I felt very happy when it flew away over the trees."
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    scan = scan_dream(PAST)
+    store.record(PAST, "english", stub_interpretation(), scan.themes, "positive", "u1")
+    store.flush()
+    yield store
+    store.close()
+
+
+def _near_duplicates(similar, text, user_id="u1"):
+    return similar.near_duplicates(text, scan_dream(text), user_id)
+
+
+def test_near_identical_dream_of_the_same_user_is_reused(store):
+    similar = SimilarDreams(store)
+    assert _near_duplicates(similar, PAST.replace("trees.", "trees!")) == [PAST]
+
+
+@pytest.mark.parametrize("text", [
+    PAST.replace("very happy", "very terrified"),
+    PAST.replace("I was walking", "I was not walking"),
+    PAST.replace("I felt very happy", "I felt not very happy"),
+])
+def test_tone_flipped_or_negated_dream_is_not_reused(store, text):
+    similar = SimilarDreams(store)
+    # The embedding alone still calls these near-identical
+    assert similar.similar(text, scan_dream(text).themes, 1, "u1")[0].score >= similar.near_duplicate
+    assert _near_duplicates(similar, text) == []
+
+
+def test_other_users_dreams_are_reused_only_when_allowed(store):
+    text = PAST.replace("trees.", "trees!")
+    assert _near_duplicates(SimilarDreams(store), text, "u2") == []
+    assert _near_duplicates(SimilarDreams(store), text, None) == []
+    assert _near_duplicates(SimilarDreams(store, cross_user=True), text, "u2") == [PAST]
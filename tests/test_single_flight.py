@@ -0,0 +1,109 @@
+import threading
+
+import pytest
+
+from dream_backends import AdmissionController, OpenAIBackend
+from dream_cache import InterpretationCache, SingleFlight
+from dream_interpreter import AdvancedDreamInterpreter
+from stubs import StubProvider, stub_interpretation
+
+CALLERS = 8
+
+
+def _concurrently(target):
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(target())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(CALLERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def _wait_for(condition, timeout=5.0):
+    event = threading.Event()
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return True
+        event.wait(0.01)
+    return False
+
+
+def _joined(single_flight, count):
+    return lambda: single_flight.stats()["coalesced"] >= count
+
+
+def test_concurrent_callers_share_one_computation():
+    single_flight, calls = SingleFlight(), []
+
+    def compute():
+        calls.append(1)
+        # Hold the flight open until every other caller has joined it
+        assert _wait_for(_joined(single_flight, CALLERS - 1))
+        return {"summary": "once"}
+
+    results, errors = _concurrently(lambda: single_flight.do("key", compute, timeout=5))
+    assert not errors
+    assert len(calls) == 1
+    # Followers get copies, so none of them can change what another sees
+    assert results == [{"summary": "once"}] * CALLERS
+
+
+def test_leader_error_reaches_every_waiter():
+    single_flight, failure = SingleFlight(), RuntimeError("backend down")
+
+    def compute():
+        assert _wait_for(_joined(single_flight, CALLERS - 1))
+        raise failure
+
+    results, errors = _concurrently(lambda: single_flight.do("key", compute, timeout=5))
+    assert not results
+    assert len(errors) == CALLERS and all(error is failure for error in errors)
+    assert single_flight.stats()["in_flight"] == 0
+
+
+@pytest.fixture
+def interpreter_for():
+    servers = []
+
+    def make(**stub):
+        servers.append(StubProvider(delay=0.3, **stub))
+        backend = OpenAIBackend(
+            servers[-1].url, "stub", retries=0, admission=AdmissionController("stub", concurrency=CALLERS, max_wait=10)
+        )
+        return AdvancedDreamInterpreter(backend=backend, cache=InterpretationCache()), servers[-1]
+
+    yield make
+    for server in servers:
+        server.stop()
+
+
+def test_concurrent_sessions_make_one_backend_call(interpreter_for):
+    interpreter, provider = interpreter_for()
+    results, errors = _concurrently(lambda: interpreter.analyze_dream_with_ai("A white horse crossed a river.", "english"))
+
+    assert not errors
+    assert provider.requests == 1
+    assert all(result == stub_interpretation() for result in results)
+
+
+def test_failed_backend_call_is_shared_but_not_cached(interpreter_for):
+    interpreter, provider = interpreter_for(statuses=[500])
+    dream = "A black dog followed me down a dark road."
+    results, errors = _concurrently(lambda: interpreter.analyze_dream_with_ai(dream, "english"))
+
+    # Every caller fell back to the rules after the one failed request
+    assert not errors
+    assert provider.requests == 1
+    assert all(result != stub_interpretation() for result in results)
+    assert interpreter.cache.get(interpreter._cache_key(dream, "english", interpreter.backend)) is None
+
+    assert interpreter.analyze_dream_with_ai(dream, "english") == stub_interpretation()
+    assert provider.requests == 2
@@ -0,0 +1,89 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from dream_backends import INTERPRETATION_KEYS, LIST_SECTIONS, OpenAIBackend
+
+
+class StubStreamHandler(BaseHTTPRequestHandler):
+    """Event stream of one '## section' reply that holds the last section back until the client has seen the first"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for index, section in enumerate(INTERPRETATION_KEYS):
+            if index == len(INTERPRETATION_KEYS) - 1:
+                # A client that buffers the whole response never sees the first section in time
+                self.server.first_before_last = self.server.first_section.wait(5)
+            self._event(f"## {section}\n")
+            self._event(f"- Stub {section}\n" if section in LIST_SECTIONS else f"Stub {section}.\n")
+        self._chunk("data: [DONE]\n\n")
+        self._chunk("")
+
+    def _event(self, content: str):
+        self._chunk(f"data: {json.dumps({'choices': [{'delta': {'content': content}}]})}\n\n")
+
+    def _chunk(self, text: str):
+        data = text.encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubStreamHandler)
+    server.daemon_threads = True
+    server.first_section, server.first_before_last = threading.Event(), None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _url(server) -> str:
+    return f"http://127.0.0.1:{server.server_port}/v1/chat/completions"
+
+
+def _consume(events, server):
+    sections = {}
+    for event in events:
+        if event.kind == "section":
+            sections[event.section] = event.data
+            server.first_section.set()
+    return sections
+
+
+def test_backend_yields_first_section_before_the_last_is_produced(stub_server):
+    from dream_interpreter import ISLAMIC_GUIDELINES
+
+    backend = OpenAIBackend(_url(stub_server), "stub", deadline=10)
+    sections = _consume(backend.stream("I saw a river at night.", "english", ISLAMIC_GUIDELINES), stub_server)
+
+    assert stub_server.first_before_last is True
+    assert list(sections) == list(INTERPRETATION_KEYS)
+    assert sections["summary"] == "Stub summary."
+
+
+def test_interpreter_streams_first_section_before_the_last_is_produced(stub_server, monkeypatch):
+    monkeypatch.setenv("DREAM_BACKEND", "openai")
+    monkeypatch.setenv("DREAM_BACKEND_URL", _url(stub_server))
+    monkeypatch.setenv("OPENAI_API_KEY", "stub")
+    monkeypatch.delenv("DREAM_FANOUT", raising=False)
+    from dream_interpreter import AdvancedDreamInterpreter
+
+    interpreter = AdvancedDreamInterpreter()
+    events = interpreter.analyze_dream_with_ai_stream("A white horse crossed the desert at dawn.", "English")
+    sections = _consume(events, stub_server)
+
+    assert stub_server.first_before_last is True
+    assert set(sections) == set(INTERPRETATION_KEYS)